@@ -3,18 +3,33 @@ import sys
 import time
 import logging
 from functools import partial
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 import cloudpickle
 import numpy as np
 import pandas as pd
 import dask.bag
 
-from neuclease.util import Timer, Grid, boxes_from_grid, box_intersection, box_to_slicing, overwrite_subvol, extract_subvol, is_box_coverage_complete
+from neuclease.util import Timer, Grid, box_intersection, box_to_slicing, overwrite_subvol, extract_subvol, is_box_coverage_complete
 from ..util import compress_volume, uncompress_volume, DebugClient
 from ..util.dask_util import drop_empty_partitions
 
 logger = logging.getLogger(__name__)
 
+# In pad_brick_data_from_volume_source(), if the halo regions to be fetched
+# account for more than this fraction of the padded volume (or if there are many of them),
+# it's cheaper to fetch the entire padded box in a single request than to fetch each halo separately.
+HALO_FETCH_RATIO_THRESHOLD = 0.5
+MAX_SEPARATE_HALO_FETCHES = 3
+
+# In apply_label_mapping(), a direct lookup table is used (instead of LabelMapper)
+# if the mapping's domain is small enough and at least this dense.
+# Note: The LUT is allocated for each call (i.e. for each partition being remapped),
+#       and a uint64 LUT of this size costs 128 MiB.  Larger domains use LabelMapper.
+LABEL_LUT_MAX_SIZE = 2**24
+LABEL_LUT_MIN_DENSITY = 0.1
+
 class Brick:
     """
     Conceptually, bricks are intended to populate (or sparsely populate)
@@ -42,6 +57,10 @@ class Brick:
 
         Note: Both boxes (logical and physical) are always stored in GLOBAL coordinates.
     """
+    # There can be millions of Bricks, so we avoid the per-instance __dict__.
+    __slots__ = ( 'logical_box', 'physical_box', 'location_id', 'compression',
+                  '_volume', '_compressed_volume', '_compressed_box', '_destroyed', '_dtype', '_create_volume_fn' )
+
     def __init__(self, logical_box, physical_box, volume=None, *, location_id=None, lazy_creation_fn=None, compression=None):
         """
         Args:
@@ -85,7 +104,8 @@ class Brick:
         self.location_id = location_id
 
         if self.location_id is None:
-            self.location_id = tuple(logical_box[0])
+            # Use plain ints (not numpy scalars), which hash, compare, and pickle faster.
+            self.location_id = tuple(self.logical_box[0].tolist())
 
         self._volume = volume
         if self._volume is not None:
@@ -112,7 +132,7 @@ class Brick:
 
 
     def __sizeof__(self):
-        return super().__sizeof__() + sum(sys.getsizeof(v) for v in vars(self))
+        return super().__sizeof__() + sum(sys.getsizeof(getattr(self, k)) for k in self.__slots__)
 
 
     @property
@@ -142,7 +162,7 @@ class Brick:
             self._volume = fn(self.physical_box)
             self._volume.flags['WRITEABLE'] = False
             assert (self._volume.shape == (self.physical_box[1] - self.physical_box[0])).all()
-            del self._create_volume_fn
+            self._create_volume_fn = None
             return self._volume
 
         raise AssertionError("This brick has no data, and no way to create it.")
@@ -178,7 +198,35 @@ class Brick:
                                f"{self}")
 
         self.compress()
-        return self.__dict__.copy()
+        return {k: getattr(self, k) for k in self.__slots__}
+
+
+    def __setstate__(self, state):
+        for k, v in state.items():
+            setattr(self, k, v)
+
+
+    def with_logical_box(self, logical_box, location_id=None):
+        """
+        Return a new Brick with the same physical_box and volume data as this one,
+        but with a different logical_box (and location_id).
+
+        The volume data (compressed or not) is shared with the new Brick, not copied,
+        so no decompression or recompression is necessary.
+        """
+        # Copy the slots directly.
+        # (copy.copy() would go through __getstate__(), which compresses this brick.)
+        new_brick = Brick.__new__(Brick)
+        for k in Brick.__slots__:
+            setattr(new_brick, k, getattr(self, k))
+
+        new_brick.logical_box = np.asarray(logical_box)
+        new_brick.logical_box.flags['WRITEABLE'] = False
+
+        if location_id is None:
+            location_id = tuple(new_brick.logical_box[0].tolist())
+        new_brick.location_id = location_id
+        return new_brick
 
 
     def destroy(self):
@@ -187,7 +235,7 @@ class Brick:
         self._destroyed = True
 
 
-def generate_bricks_from_volume_source( bounding_box, grid, volume_accessor_func, client, partition_size=None, sparse_boxes=None, lazy=False, compression=None ):
+def generate_bricks_from_volume_source( bounding_box, grid, volume_accessor_func, client, partition_size=None, sparse_boxes=None, lazy=False, compression=None, io_threads=1 ):
     """
     Generate a dask.Bag of Bricks for the given bounding box and grid.
 
@@ -219,45 +267,58 @@ def generate_bricks_from_volume_source( bounding_box, grid, volume_accessor_func
 
         halo: An integer or shape indicating how much halo to add to each Brick's physical_box.
               The halo is applied in both 'dense' and 'sparse' cases.
+
+        io_threads:
+            Optional. If greater than 1, the bricks within each partition are fetched
+            concurrently via a thread pool of (up to) this size, which helps when
+            volume_accessor_func is dominated by network or disk latency.
+            The volume_accessor_func must be thread-safe if you use this option.
+            Has no effect if lazy=True.
     """
     if client is None:
         client = DebugClient()
 
+    bounding_box = np.asarray(bounding_box, dtype=np.int64)
+
     if sparse_boxes is None:
         # Generate boxes from densely populated grid
-        logical_boxes = boxes_from_grid(bounding_box, grid, include_halos=False)
-        physical_boxes = boxes_from_grid(bounding_box, grid, include_halos=True, clipped=True)
+        logical_boxes = boxes_array_from_grid(bounding_box, grid, include_halos=False)
+        physical_boxes = clip_boxes(boxes_array_from_grid(bounding_box, grid, include_halos=True), bounding_box)
         assert len(logical_boxes) == len(physical_boxes)
-        logical_and_physical_boxes = zip( logical_boxes, physical_boxes )
     else:
         # User provided list of physical boxes.
         # Clip them to the bounding box and calculate the logical boxes.
         if not hasattr(sparse_boxes, '__len__'):
             sparse_boxes = list( sparse_boxes )
-        physical_boxes = np.asarray( sparse_boxes )
+        physical_boxes = np.array( sparse_boxes, dtype=np.int64 )
         assert physical_boxes.ndim == 3 and physical_boxes.shape[1:3] == (2,3)
 
-        def logical_and_clipped( box ):
-            midpoint = (box[0] + box[1]) // 2
-            logical_box = grid.compute_logical_box( midpoint )
-            box += (-grid.halo_shape, grid.halo_shape)
-            # Note: Non-intersecting boxes will have non-positive shape after clipping
-            clipped_box = box_intersection(box, bounding_box)
-            return ( logical_box, clipped_box )
+        # Logical box is the grid block containing each box's midpoint.
+        block_shape = np.asarray(grid.block_shape, dtype=np.int64)
+        offset = np.asarray(grid.offset, dtype=np.int64)
+        midpoints = (physical_boxes[:, 0, :] + physical_boxes[:, 1, :]) // 2
+        logical_starts = ((midpoints - offset) // block_shape) * block_shape + offset
+        logical_boxes = np.stack((logical_starts, logical_starts + block_shape), axis=1)
 
-        logical_and_physical_boxes = map(logical_and_clipped, physical_boxes)
+        # Note: Non-intersecting boxes will have non-positive shape after clipping
+        physical_boxes[:, 0, :] -= grid.halo_shape
+        physical_boxes[:, 1, :] += grid.halo_shape
+        physical_boxes = clip_boxes(physical_boxes, bounding_box)
 
         # Drop any boxes that fall completely outside the bounding box
         # Check that physical box doesn't completely fall outside its logical_box
-        def is_valid(logical_and_physical):
-            logical_box, physical_box = logical_and_physical
-            return (physical_box[1] > logical_box[0]).all() and (physical_box[0] < logical_box[1]).all()
-        logical_and_physical_boxes = filter(is_valid, logical_and_physical_boxes )
-
-    if not hasattr(logical_and_physical_boxes, '__len__'):
-        logical_and_physical_boxes = list(logical_and_physical_boxes) # need len()
-
-    num_bricks = len(logical_and_physical_boxes)
+        valid = ( (physical_boxes[:, 1, :] > logical_boxes[:, 0, :]).all(axis=1)
+                  & (physical_boxes[:, 0, :] < logical_boxes[:, 1, :]).all(axis=1) )
+        logical_boxes = logical_boxes[valid]
+        physical_boxes = physical_boxes[valid]
+
+    # Store all boxes in a single contiguous table of shape (N, 2, 2, D):
+    #   boxes_table[:, 0] -> logical boxes
+    #   boxes_table[:, 1] -> physical boxes
+    # Each item we distribute below is just a row of this table (a view, not a copy).
+    boxes_table = np.stack((logical_boxes, physical_boxes), axis=1)
+
+    num_bricks = len(boxes_table)
     if num_bricks == 0:
         return dask.bag.from_sequence([]), num_bricks
 
@@ -274,22 +335,20 @@ def generate_bricks_from_volume_source( bounding_box, grid, volume_accessor_func
 
     partition_size = max(1, partition_size)
 
-    def brick_size(log_phys):
-        _logical, physical = log_phys
-        return np.uint64(np.prod(physical[1] - physical[0]))
-
-    num_partitions = int(np.ceil(len(logical_and_physical_boxes) / partition_size))
+    num_partitions = int(np.ceil(num_bricks / partition_size))
 
     # Avoid powers-of-two partition sizes, since they hash poorly.
     if num_partitions != 1 and 2**np.log2(num_partitions) == num_partitions:
         #logger.info("Changing num_partitions to avoid power of two")
-        if num_partitions < len(logical_and_physical_boxes):
+        if num_partitions < num_bricks:
             num_partitions += 1
         else:
             num_partitions -= 1
 
     # Distribute data across the cluster NOW, to force even distribution.
-    boxes_bag = dask.bag.from_sequence( logical_and_physical_boxes, npartitions=num_partitions )
+    # Each partition holds a single chunk of the boxes table (rather than a list of individual box arrays),
+    # which is much cheaper to serialize and deserialize.
+    boxes_bag = dask.bag.from_sequence( np.array_split(boxes_table, num_partitions), npartitions=num_partitions )
     if boxes_bag.npartitions != num_partitions:
         boxes_bag = boxes_bag.repartition(num_partitions)
 
@@ -302,7 +361,8 @@ def generate_bricks_from_volume_source( bounding_box, grid, volume_accessor_func
     boxes_bag = boxes_bag.persist()
     boxes_bag.compute()
 
-    total_volume = sum(map(brick_size, logical_and_physical_boxes))
+    physical_shapes = boxes_table[:, 1, 1, :] - boxes_table[:, 1, 0, :]
+    total_volume = np.prod(physical_shapes, axis=1).astype(np.uint64).sum()
     logger.info(f"Initializing bag of {num_bricks} Bricks "
                 f"(over {boxes_bag.npartitions} partitions) with total volume {total_volume/1e9:.1f} Gvox ")
                 #f"(scatter took {scatter_timer.timedelta})")
@@ -310,21 +370,22 @@ def generate_bricks_from_volume_source( bounding_box, grid, volume_accessor_func
     if not isinstance(client, DebugClient) and os.environ.get("DEBUG_FLOW", "0") != "0":
         def worker_address(part):
             from distributed import get_worker
-            return [(get_worker().address, len(part))]
+            return [(get_worker().address, sum(map(len, part)))]
 
         workers_and_lens = boxes_bag.map_partitions(worker_address).compute()
         logger.info("Workers and assigned partition lengths:")
         for worker, length in sorted(workers_and_lens):
             logger.info(f"{worker}: {length}")
 
-    def make_brick( logical_and_physical_box ):
+    block_shape = np.asarray(grid.block_shape)
+
+    def make_brick( logical_and_physical_box, location_id ):
         logical_box, physical_box = logical_and_physical_box
 
         # See comment in Brick.__init__
         logical_box.flags['WRITEABLE'] = False
         physical_box.flags['WRITEABLE'] = False
 
-        location_id = tuple(logical_box[0] // grid.block_shape)
         if lazy:
             return Brick(logical_box, physical_box, location_id=location_id, lazy_creation_fn=volume_accessor_func, compression=compression)
         else:
@@ -332,15 +393,87 @@ def generate_bricks_from_volume_source( bounding_box, grid, volume_accessor_func
             return Brick(logical_box, physical_box, volume, location_id=location_id, compression=compression)
 
     def make_partition_bricks(part):
-        newpart = []
-        for item in part:
-            newpart.append(make_brick(item))
-        return newpart
+        # Each partition contains one chunk of the boxes table (see above).
+        part_table = np.concatenate(list(part))
+        location_ids = [*map(tuple, (part_table[:, 0, 0, :] // block_shape).tolist())]
+
+        if lazy or io_threads <= 1 or len(part_table) <= 1:
+            return [*map(make_brick, part_table, location_ids)]
+
+        # Overlap the volume fetches for this partition.
+        with ThreadPoolExecutor(min(io_threads, len(part_table))) as executor:
+            return [*executor.map(make_brick, part_table, location_ids)]
 
     bricks = boxes_bag.map_partitions( make_partition_bricks )
     return bricks, num_bricks
 
 
+def boxes_array_from_grid(bounding_box, grid, include_halos=False):
+    """
+    Vectorized equivalent of ``boxes_from_grid(bounding_box, grid, include_halos)``.
+
+    Returns all boxes of the given grid which intersect the bounding_box,
+    in a single array of shape (N, 2, D), ordered in C-order (same as boxes_from_grid).
+    Each row is a box: (start, stop).
+
+    Args:
+        bounding_box:
+            (start, stop)
+
+        grid:
+            Grid
+
+        include_halos:
+            If True, each box is expanded by the grid's halo_shape.
+            (The boxes are NOT clipped to the bounding_box.)
+
+    Returns:
+        ndarray, shape (N, 2, D), dtype int64
+    """
+    bounding_box = np.asarray(bounding_box, dtype=np.int64)
+    block_shape = np.asarray(grid.block_shape, dtype=np.int64)
+    offset = np.asarray(grid.offset, dtype=np.int64)
+    ndim = len(block_shape)
+
+    # Round the bounding box outward to the nearest grid lines.
+    aligned_start = ((bounding_box[0] - offset) // block_shape) * block_shape + offset
+    aligned_stop = ((bounding_box[1] - offset + block_shape - 1) // block_shape) * block_shape + offset
+
+    axis_starts = [np.arange(start, stop, step) for start, stop, step in zip(aligned_start, aligned_stop, block_shape)]
+    starts = np.stack(np.meshgrid(*axis_starts, indexing='ij'), axis=-1).reshape(-1, ndim)
+
+    boxes = np.empty((len(starts), 2, ndim), dtype=np.int64)
+    boxes[:, 0, :] = starts
+    boxes[:, 1, :] = starts + block_shape
+
+    if include_halos:
+        halo_shape = np.asarray(grid.halo_shape, dtype=np.int64)
+        boxes[:, 0, :] -= halo_shape
+        boxes[:, 1, :] += halo_shape
+
+    return boxes
+
+
+def clip_boxes(boxes, bounding_box):
+    """
+    Vectorized equivalent of calling ``box_intersection(box, bounding_box)`` for every box in boxes.
+
+    Args:
+        boxes:
+            ndarray, shape (N, 2, D)
+        bounding_box:
+            (start, stop)
+
+    Returns:
+        ndarray, shape (N, 2, D)
+        Note: Boxes which do not intersect the bounding_box will have non-positive shape.
+    """
+    clipped = np.array(boxes, dtype=np.int64)
+    np.maximum(clipped[:, 0, :], bounding_box[0], out=clipped[:, 0, :])
+    np.minimum(clipped[:, 1, :], bounding_box[1], out=clipped[:, 1, :])
+    return clipped
+
+
 def clip_to_logical( brick, recompress=True ):
     """
     Truncate the given brick so that it's volume does not exceed the bounds of its logical_box.
@@ -362,7 +495,7 @@ def clip_to_logical( brick, recompress=True ):
     return new_brick
 
 
-def pad_brick_data_from_volume_source( padding_grid, volume_accessor_func, brick ):
+def pad_brick_data_from_volume_source( padding_grid, volume_accessor_func, brick, io_threads=1 ):
     """
     Expand the given Brick's data until its physical_box is aligned with the given padding_grid.
     The data in the expanded region will be sourced from the given volume_accessor_func.
@@ -384,6 +517,8 @@ def pad_brick_data_from_volume_source( padding_grid, volume_accessor_func, brick
         brick: Brick
         padding_grid: Grid
         volume_accessor_func: Callable with signature: f(box) -> ndarray
+        io_threads: If greater than 1, fetch the halo regions concurrently.
+                    (volume_accessor_func must be thread-safe.)
 
     Returns: Brick
 
@@ -401,33 +536,38 @@ def pad_brick_data_from_volume_source( padding_grid, volume_accessor_func, brick
     assert ((brick.logical_box - padding_grid.offset) % block_shape == 0).all(), \
         f"Padding grid {padding_grid.offset} must be aligned with brick logical_box: {brick.logical_box}"
 
-    # Subtract offset to calculate the needed padding
-    offset_physical_box = brick.physical_box - padding_grid.offset
+    if ((brick.logical_box[1] - brick.logical_box[0]) == block_shape).all():
+        # Common case: The padding_grid is the brick's own grid,
+        # so the padded box is simply the logical box.
+        if (brick.physical_box == brick.logical_box).all():
+            return brick
+        assert (brick.physical_box[0] >= brick.logical_box[0]).all() and (brick.physical_box[1] <= brick.logical_box[1]).all(), \
+            f"Brick physical_box must lie within its logical_box: {brick}"
+        padded_box = brick.logical_box
+    else:
+        # Subtract offset to calculate the needed padding
+        offset_physical_box = brick.physical_box - padding_grid.offset
 
-    if (offset_physical_box % block_shape == 0).all():
-        # Internal data is already aligned to the padding_grid.
-        return brick
+        if (offset_physical_box % block_shape == 0).all():
+            # Internal data is already aligned to the padding_grid.
+            return brick
 
-    offset_padded_box = np.array([offset_physical_box[0] // block_shape * block_shape,
-                                  (offset_physical_box[1] + block_shape - 1) // block_shape * block_shape])
+        offset_padded_box = np.array([offset_physical_box[0] // block_shape * block_shape,
+                                      (offset_physical_box[1] + block_shape - 1) // block_shape * block_shape])
+
+        # Re-add offset
+        padded_box = offset_padded_box + padding_grid.offset
 
-    # Re-add offset
-    padded_box = offset_padded_box + padding_grid.offset
     assert (padded_box[0] >= brick.logical_box[0]).all()
     assert (padded_box[1] <= brick.logical_box[1]).all()
 
-    # Initialize a new volume of the fully-padded shape
     padded_volume_shape = padded_box[1] - padded_box[0]
-    padded_volume = np.zeros(padded_volume_shape, dtype=brick.volume.dtype)
-
-    # Overwrite the previously existing data in the new padded volume
     orig_box = brick.physical_box
     orig_box_within_padded = orig_box - padded_box[0]
-    overwrite_subvol(padded_volume, orig_box_within_padded, brick.volume)
 
     # Check for a non-zero-volume halo on all six sides.
     halo_boxes = []
-    for axis in range(padded_volume.ndim):
+    for axis in range(len(padded_volume_shape)):
         if orig_box[0,axis] != padded_box[0,axis]:
             leading_halo_box = padded_box.copy()
             leading_halo_box[1, axis] = orig_box[0,axis]
@@ -441,10 +581,39 @@ def pad_brick_data_from_volume_source( padding_grid, volume_accessor_func, brick
     assert halo_boxes, \
         "How could halo_boxes be empty if there was padding needed?"
 
-    for halo_box in halo_boxes:
-        # Retrieve padding data for one halo side
-        halo_volume = volume_accessor_func(halo_box)
+    # Per-request overhead often dominates for remote sources.
+    # If the halos are large (or numerous), just fetch the whole padded box at once.
+    halo_voxels = np.prod(np.diff(halo_boxes, axis=1)[:, 0, :], axis=1).sum()
+    if ( len(halo_boxes) > MAX_SEPARATE_HALO_FETCHES
+         or halo_voxels / np.prod(padded_volume_shape) > HALO_FETCH_RATIO_THRESHOLD ):
+        padded_volume = volume_accessor_func(padded_box)
+        assert (padded_volume.shape == padded_volume_shape).all()
+
+        # We're about to write into this array, so make sure it doesn't belong to someone else.
+        if not (padded_volume.flags['OWNDATA'] and padded_volume.flags['WRITEABLE']):
+            padded_volume = padded_volume.copy()
 
+        overwrite_subvol(padded_volume, orig_box_within_padded, brick.volume)
+        new_brick = Brick( brick.logical_box, padded_box, padded_volume, location_id=brick.location_id, compression=brick.compression )
+        brick.compress()
+        return new_brick
+
+    # Initialize a new volume of the fully-padded shape.
+    # No need to zero-initialize: Together, the original box and the
+    # halo boxes cover the entire padded box, so every voxel is overwritten below.
+    padded_volume = np.empty(padded_volume_shape, dtype=brick.volume.dtype)
+
+    # Overwrite the previously existing data in the new padded volume
+    overwrite_subvol(padded_volume, orig_box_within_padded, brick.volume)
+
+    # Retrieve padding data for each halo side
+    if io_threads > 1 and len(halo_boxes) > 1:
+        with ThreadPoolExecutor(min(io_threads, len(halo_boxes))) as executor:
+            halo_volumes = [*executor.map(volume_accessor_func, halo_boxes)]
+    else:
+        halo_volumes = map(volume_accessor_func, halo_boxes)
+
+    for halo_box, halo_volume in zip(halo_boxes, halo_volumes):
         # Overwrite in the final padded volume
         halo_box_within_padded = halo_box - padded_box[0]
         overwrite_subvol(padded_volume, halo_box_within_padded, halo_volume)
@@ -469,32 +638,64 @@ def apply_label_mapping(bricks, mapping_pairs):
             [[orig,new],
              [orig,new],
              ... ],
+
+    Note: If mapping_pairs is empty, the bricks are returned as-is.
     """
+    if len(mapping_pairs) == 0:
+        return bricks
+
     from dvidutils import LabelMapper
     def remap_bricks(partition_bricks):
         domain, codomain = mapping_pairs.transpose()
-        mapper = LabelMapper(domain, codomain)
-
-        partition_bricks = list(partition_bricks)
+        domain_max = int(domain.max())
+
+        # If the mapping's domain is dense enough, a direct lookup table
+        # (i.e. a vectorized gather) is much faster than a hash lookup per voxel.
+        if domain_max < LABEL_LUT_MAX_SIZE and len(domain) >= LABEL_LUT_MIN_DENSITY * (domain_max + 1):
+            lut = np.arange(domain_max + 1, dtype=codomain.dtype)
+            lut[domain] = codomain
+
+            def remap(volume):
+                if volume.max() <= domain_max:
+                    return lut[volume].astype(volume.dtype, copy=False)
+
+                # Labels outside the LUT are unmapped (left as-is)
+                remapped = volume.copy()
+                in_lut = (volume <= domain_max)
+                remapped[in_lut] = lut[volume[in_lut]]
+                return remapped
+        else:
+            mapper = LabelMapper(domain, codomain)
+
+            def remap(volume):
+                # TODO: Apparently LabelMapper can't handle non-contiguous arrays right now.
+                #       (It yields incorrect results)
+                #       Check to see if this is still a problem in the latest version of xtensor-python.
+                # Note: Brick volumes are read-only, so we always need a copy here anyway.
+                volume = volume.copy(order='C')
+                mapper.apply_inplace(volume, allow_unmapped=True)
+                return volume
+
+        remapped_bricks = []
         for brick in partition_bricks:
-            # TODO: Apparently LabelMapper can't handle non-contiguous arrays right now.
-            #       (It yields incorrect results)
-            #       Check to see if this is still a problem in the latest version of xtensor-python.
-            brick.volume = np.asarray( brick.volume, order='C' )
-
-            mapper.apply_inplace(brick.volume, allow_unmapped=True)
+            remapped_brick = Brick( brick.logical_box, brick.physical_box, remap(brick.volume),
+                                    location_id=brick.location_id, compression=brick.compression )
+            remapped_brick.compress()
             brick.compress()
-        return partition_bricks
+            remapped_bricks.append(remapped_brick)
+        return remapped_bricks
 
     # Use mapPartitions (instead of map) so LabelMapper can be constructed just once per partition
     remapped_bricks = bricks.map_partitions( remap_bricks )
 
+    # Note: Bag.persist() returns a new Bag; the original remains unpersisted.
+    #       The persisted bricks are held in their compressed form (see Brick.compress()).
     # FIXME: Time this persist()?
-    remapped_bricks.persist()
+    remapped_bricks = remapped_bricks.persist()
     return remapped_bricks
 
 
-def realign_bricks_to_new_grid(new_grid, original_bricks, output_accessor_fn=None):
+def realign_bricks_to_new_grid(new_grid, original_bricks, output_accessor_fn=None, npartitions=None):
     """
     Given a dask.Bag of Bricks which are tiled over some original grid,
     chop them up and reassemble them into a new Bag of Bricks,
@@ -509,6 +710,10 @@ def realign_bricks_to_new_grid(new_grid, original_bricks, output_accessor_fn=Non
             TODO
         output_accessor_fn:
             TODO
+        npartitions:
+            How many partitions to use when shuffling the brick fragments into their new groups.
+            If not provided, the partition count is chosen so that the output
+            has (roughly) the same number of bricks per partition as the input.
 
     Returns: dask.Bag of Bricks
     """
@@ -516,7 +721,7 @@ def realign_bricks_to_new_grid(new_grid, original_bricks, output_accessor_fn=Non
         aligned = ((brick.logical_box - new_grid.offset) % new_grid.block_shape == 0).all()
         aligned &= (brick.physical_box[0] >= brick.logical_box[0]).all()
         aligned &= (brick.physical_box[1] <= brick.logical_box[1]).all()
-        return (aligned, brick.logical_box[0])
+        return (aligned, brick.logical_box[0], brick.physical_box)
 
     # Special optimization:
     # If the bricks are already aligned, return immediately
@@ -525,16 +730,32 @@ def realign_bricks_to_new_grid(new_grid, original_bricks, output_accessor_fn=Non
     if len(flags_and_corners) == 0:
         return original_bricks # No bricks.  Can happen to small volumes when downsampling several times.
 
-    flags, corners = zip(*flags_and_corners)
+    flags, corners, physical_boxes = zip(*flags_and_corners)
     if all(flags) and pd.DataFrame(np.array(corners)).duplicated().sum() == 0:
         return original_bricks
 
+    if npartitions is None:
+        # Count the destination bricks (using only the boxes; no data is fetched here),
+        # and keep the same bricks-per-partition density as the input.
+        dest_corners = np.concatenate([boxes_array_from_grid(box, new_grid)[:, 0, :] for box in physical_boxes])
+        num_dest_bricks = len(pd.DataFrame(dest_corners).drop_duplicates())
+        bricks_per_partition = len(physical_boxes) / original_bricks.npartitions
+        npartitions = max(1, int(np.ceil(num_dest_bricks / bricks_per_partition)))
+
+        # Avoid powers-of-two partition counts, since our location_ids hash poorly with them.
+        if npartitions > 1 and (npartitions & (npartitions - 1)) == 0:
+            npartitions += 1
+
     # For each original brick, split it up according
     # to the new logical box destinations it will map to.
     brick_fragments = original_bricks.map( partial(split_brick, new_grid) ).flatten()
 
+    # Before shuffling, merge the fragments within each partition that share a destination.
+    # (Analogous to a map-side combine: fewer, larger fragments are sent over the network.)
+    brick_fragments = brick_fragments.map_partitions( _combine_partition_fragments )
+
     # Group fragments according to their new homes
-    grouped_brick_fragments = brick_fragments.groupby(lambda brick: brick.location_id)
+    grouped_brick_fragments = brick_fragments.groupby(lambda brick: brick.location_id, npartitions=npartitions)
 
     # Re-assemble fragments into the new grid structure.
     assemble = partial(assemble_brick_fragments, output_accessor_fn=output_accessor_fn)
@@ -572,26 +793,34 @@ def split_brick(new_grid, original_brick):
             (original_brick.physical_box[1] <= original_brick.logical_box[1]).all()), \
                 f"{original_brick.physical_box[:,::-1].tolist()} extends outside of {original_brick.logical_box[:,::-1].tolist()}"
 
-    ## FIXME:
-    ## If the brick lies completely within a single grid square for the destination block,
-    ## Then boxes_from_grid() will only return a single box and the brick's volume will remain unchanged.
-    ## In that case, it's probably best not to uncompress/recompress the brick.
-    ## Just create a new brick with the same compressed data and a different logical_box.
-
     # Iterate over the new boxes that intersect with the original brick
-    for destination_box in boxes_from_grid(original_brick.physical_box, new_grid, include_halos=True):
-        # Physical intersection of original with new
-        split_box = box_intersection(destination_box, original_brick.physical_box)
-
+    destination_boxes = boxes_array_from_grid(original_brick.physical_box, new_grid, include_halos=True)
+
+    # Physical intersection of original with new
+    split_boxes = clip_boxes(destination_boxes, original_brick.physical_box)
+
+    # Subtract out halo to get logical_boxes
+    new_logical_boxes = destination_boxes.copy()
+    new_logical_boxes[:, 0, :] += new_grid.halo_shape
+    new_logical_boxes[:, 1, :] -= new_grid.halo_shape
+    new_location_ids = [*map(tuple, (new_logical_boxes[:, 0, :] // new_grid.block_shape).tolist())]
+
+    # Special case:
+    # If the brick lies completely within a single destination block,
+    # its volume remains unchanged, so don't uncompress/recompress the brick.
+    # Just return a brick with the same data and a different logical_box.
+    if len(destination_boxes) == 1 and (split_boxes[0] == original_brick.physical_box).all():
+        new_logical_box = new_logical_boxes[0]
+        new_location_id = new_location_ids[0]
+        if (new_logical_box == original_brick.logical_box).all() and new_location_id == original_brick.location_id:
+            return [original_brick]
+        return [original_brick.with_logical_box(new_logical_box, new_location_id)]
+
+    for new_logical_box, new_location_id, split_box in zip(new_logical_boxes, new_location_ids, split_boxes):
         # Extract portion of original volume data that belongs to this new box
         split_box_internal = split_box - original_brick.physical_box[0]
         fragment_vol = extract_subvol(original_brick.volume, split_box_internal)
 
-        # Subtract out halo to get logical_box
-        new_logical_box = destination_box - (-new_grid.halo_shape, new_grid.halo_shape)
-
-        new_location_id = tuple(new_logical_box[0] // new_grid.block_shape)
-
         fragment_brick = Brick(new_logical_box, split_box, fragment_vol, location_id=new_location_id, compression=original_brick.compression)
         fragment_brick.compress()
 
@@ -601,6 +830,50 @@ def split_brick(new_grid, original_brick):
     return fragments
 
 
+def _combine_partition_fragments( fragments ):
+    """
+    Helper for realign_bricks_to_new_grid().
+
+    Given the brick fragments in a single partition, merge fragments with
+    the same location_id into a single (larger) fragment, as long as their
+    physical boxes exactly tile their combined bounding box.
+    Fragments that can't be merged that way are returned unchanged,
+    to be assembled after the shuffle by assemble_brick_fragments().
+
+    Note:
+        Unlike assemble_brick_fragments(), this never drops fragments,
+        even if they lie entirely within the halo, since other fragments
+        for the same destination may reside in other partitions.
+    """
+    groups = defaultdict(list)
+    for frag in fragments:
+        groups[frag.location_id].append(frag)
+
+    combined_fragments = []
+    for group in groups.values():
+        if len(group) == 1:
+            combined_fragments.extend(group)
+            continue
+
+        physical_boxes = np.array([frag.physical_box for frag in group])
+        combined_box = np.array((physical_boxes[:, 0, :].min(axis=0), physical_boxes[:, 1, :].max(axis=0)))
+        if not is_box_coverage_complete(physical_boxes, combined_box):
+            combined_fragments.extend(group)
+            continue
+
+        combined_volume = np.empty(combined_box[1] - combined_box[0], group[0].volume.dtype)
+        for frag in group:
+            overwrite_subvol(combined_volume, frag.physical_box - combined_box[0], frag.volume)
+            frag.compress()
+
+        combined_frag = Brick( group[0].logical_box, combined_box, combined_volume,
+                               location_id=group[0].location_id, compression=group[0].compression )
+        combined_frag.compress()
+        combined_fragments.append(combined_frag)
+
+    return combined_fragments
+
+
 def assemble_brick_fragments( fragments, output_accessor_fn=None ):
     """
     Given a list of Bricks with identical logical_boxes, splice their volumes
@@ -634,8 +907,12 @@ def assemble_brick_fragments( fragments, output_accessor_fn=None ):
     """
     fragments = list(fragments)
 
+    # Gather all fragment boxes into one table of shape (N, 2, 2, D)
+    boxes_table = np.array([(frag.logical_box, frag.physical_box) for frag in fragments])
+    logical_boxes = boxes_table[:, 0]
+    physical_boxes = boxes_table[:, 1]
+
     # All logical boxes must be the same
-    logical_boxes = np.asarray([frag.logical_box for frag in fragments])
     assert (logical_boxes == logical_boxes[0]).all(), \
         "Cannot assemble brick fragments from different logical boxes. "\
         "They belong to different bricks!"
@@ -643,7 +920,6 @@ def assemble_brick_fragments( fragments, output_accessor_fn=None ):
     final_location_id = fragments[0].location_id
 
     # The final physical box is the min/max of all fragment physical extents.
-    physical_boxes = np.array([frag.physical_box for frag in fragments])
     assert physical_boxes.ndim == 3 # (N, 2, Dim)
     assert physical_boxes.shape == ( len(fragments), 2, final_logical_box.shape[1] )
 
@@ -665,9 +941,12 @@ def assemble_brick_fragments( fragments, output_accessor_fn=None ):
     final_volume_shape = final_physical_box[1] - final_physical_box[0]
     dtype = fragments[0].volume.dtype
 
-    # If the physical boxes don't completely fill the final_box,
-    # then we will need to use the output_accessor_fn (if given).
-    if output_accessor_fn is None or is_box_coverage_complete(physical_boxes, final_physical_box):
+    # If the fragments completely tile the final box, every voxel will be
+    # overwritten below, so there's no need to initialize the volume.
+    # Otherwise, the gaps are filled from output_accessor_fn (if given) or zeros.
+    if is_box_coverage_complete(physical_boxes, final_physical_box):
+        final_volume = np.empty(final_volume_shape, dtype)
+    elif output_accessor_fn is None:
         final_volume = np.zeros(final_volume_shape, dtype)
     else:
         final_volume = output_accessor_fn(final_physical_box)
@@ -40,7 +40,7 @@ class BrickWall:
     ##
 
     @classmethod
-    def from_accessor_func(cls, bounding_box, grid, volume_accessor_func=None, client=None, target_partition_size_voxels=None, sparse_boxes=None, lazy=False, compression=None):
+    def from_accessor_func(cls, bounding_box, grid, volume_accessor_func=None, client=None, target_partition_size_voxels=None, sparse_boxes=None, lazy=False, compression=None, io_threads=1):
         """
         Convenience constructor, taking an arbitrary volume_accessor_func.
         
@@ -73,6 +73,10 @@ class BrickWall:
             compression:
                 If provided, the brick volume data will be serialized/stored in a compressed format.
                 See ``flyemflows.util.compressed_volume.COMPRESSION_METHODS``
+
+            io_threads:
+                If greater than 1, fetch the bricks in each partition concurrently using this many threads.
+                The volume_accessor_func must be thread-safe.
         """
         bounding_box = np.asarray(bounding_box)
         
@@ -94,12 +98,13 @@ class BrickWall:
         block_size_voxels = np.prod(grid.block_shape)
         rdd_partition_length = target_partition_size_voxels // block_size_voxels
 
-        bricks, num_bricks = generate_bricks_from_volume_source(bounding_box, grid, volume_accessor_func, client, rdd_partition_length, sparse_boxes, lazy, compression=compression)
+        bricks, num_bricks = generate_bricks_from_volume_source(bounding_box, grid, volume_accessor_func, client, rdd_partition_length, sparse_boxes, lazy,
+                                                                compression=compression, io_threads=io_threads)
         return BrickWall( bounding_box, grid, bricks, num_bricks )
 
 
     @classmethod
-    def from_volume_service(cls, volume_service, scale=0, bounding_box_zyx=None, client=None, target_partition_size_voxels=None, halo=0, sparse_block_mask=None, lazy=False, compression=None):
+    def from_volume_service(cls, volume_service, scale=0, bounding_box_zyx=None, client=None, target_partition_size_voxels=None, halo=0, sparse_block_mask=None, lazy=False, compression=None, io_threads=1):
         """
         Convenience constructor, initialized from a VolumeService object.
         
@@ -139,6 +144,9 @@ class BrickWall:
             compression:
                 If provided, the brick volume data will be serialized/stored in a compressed format.
                 See ``flyemflows.util.compressed_volume.COMPRESSION_METHODS``
+
+            io_threads:
+                If greater than 1, fetch the bricks in each partition concurrently using this many threads.
         """
         grid = Grid(volume_service.preferred_message_shape, (0,0,0), halo)
         
@@ -184,7 +192,8 @@ class BrickWall:
                                              target_partition_size_voxels,
                                              sparse_boxes,
                                              lazy,
-                                             compression=compression )
+                                             compression=compression,
+                                             io_threads=io_threads )
 
 
     ##
@@ -202,21 +211,22 @@ class BrickWall:
         return BrickWall( self.bounding_box, self.grid, filtered_bricks, None ) # Don't know num_bricks any more
 
 
-    def realign_to_new_grid(self, new_grid, output_accessor_fn=None):
+    def realign_to_new_grid(self, new_grid, output_accessor_fn=None, npartitions=None):
         """
         Chop upand the Bricks in this BrickWall reassemble them into a new BrickWall,
         tiled according to the given new_grid.
         
         Note: Requires data shuffling.
+              See realign_bricks_to_new_grid() regarding npartitions.
         
         Returns: A a new BrickWall, with a new internal RDD for bricks.
         """
-        new_bricks = realign_bricks_to_new_grid( new_grid, self.bricks, output_accessor_fn )
+        new_bricks = realign_bricks_to_new_grid( new_grid, self.bricks, output_accessor_fn, npartitions )
         new_wall = BrickWall( self.bounding_box, new_grid, new_bricks ) # Don't know num_bricks any more
         return new_wall
 
 
-    def fill_missing(self, volume_accessor_func, padding_grid=None):
+    def fill_missing(self, volume_accessor_func, padding_grid=None, io_threads=1):
         """
         For each brick whose physical_box does not extend to all edges of its logical_box,
         fill the missing space with data from the given volume accessor.
@@ -230,12 +240,16 @@ class BrickWall:
             padding_grid:
                 (Optional.) Need not be identical to the BrickWall's native grid,
                 but must divide evenly into it. If not provided, the native grid is used.
+
+            io_threads:
+                (Optional.) If greater than 1, each brick's halo regions are fetched concurrently.
+                The volume_accessor_func must be thread-safe.
         """
         if padding_grid is None:
             padding_grid = self.grid
             
         def pad_brick(brick):
-            return pad_brick_data_from_volume_source(padding_grid, volume_accessor_func, brick)
+            return pad_brick_data_from_volume_source(padding_grid, volume_accessor_func, brick, io_threads)
         
         padded_bricks = self.bricks.map( pad_brick )
         new_wall = BrickWall( self.bounding_box, self.grid, padded_bricks, self.num_bricks )
@@ -248,7 +262,12 @@ class BrickWall:
         Does not change the brick data, just the logical/physical boxes.
         
         Also, translates the bounding box and grid.
+
+        Note: If the offset is zero, this BrickWall is returned as-is (no copy).
         """
+        if not np.asarray(offset_zyx).any():
+            return self
+
         new_bounding_box = None
         if self.bounding_box is not None:
             new_bounding_box = self.bounding_box + offset_zyx
@@ -263,7 +282,7 @@ class BrickWall:
             return Brick( brick.logical_box + offset_zyx,
                           brick.physical_box + offset_zyx,
                           brick.volume,
-                          location_id=tuple(brick.logical_box[0] // new_grid.block_shape),
+                          location_id=tuple((brick.logical_box[0] // new_grid.block_shape).tolist()),
                           compression=brick.compression )
         translated_bricks = self.bricks.map( translate_brick )
         
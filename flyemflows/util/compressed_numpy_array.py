@@ -164,13 +164,13 @@ class CompressedNumpyArray(object):
             numpy_array, _, _ = decode_mask_array(lz4.frame.decompress(self.compressed_mask_array), self.shape)
             numpy_array = np.asarray(numpy_array, order='C')
         else:
-            numpy_array = np.ndarray( shape=self.shape, dtype=self.dtype )
-            
             # See serialization of 2D, 1D and 0D arrays, above.
-            if numpy_array.ndim <= 2:
-                buf = lz4.frame.decompress(self.serialized_subarrays[0])
-                numpy_array[:] = np.frombuffer(buf, self.dtype).reshape( numpy_array.shape )
+            if len(self.shape) <= 2:
+                # Decompress into a (writable) bytearray and use it directly, without an extra copy.
+                buf = lz4.frame.decompress(self.serialized_subarrays[0], return_bytearray=True)
+                numpy_array = np.frombuffer(buf, self.dtype).reshape( self.shape )
             else:
+                numpy_array = np.ndarray( shape=self.shape, dtype=self.dtype )
                 for subarray, serialized_subarray in zip(numpy_array, self.serialized_subarrays):
                     buf = lz4.frame.decompress(serialized_subarray)
                     subarray[:] = np.frombuffer(buf, self.dtype).reshape( subarray.shape )
@@ -152,35 +152,42 @@ def run_on_each_worker(func, client=None, once_per_machine=False, return_hostnam
         logger.info(f"Ran {funcname} on the driver only")
         return results
 
-    all_worker_hostnames = client.run(socket.gethostname)
-    if not once_per_machine:
-        worker_hostnames = all_worker_hostnames
+    # The scheduler already knows the worker addresses,
+    # so we don't need an extra round-trip to the workers to list them.
+    workers = list(client.scheduler_info()['workers'].keys())
 
     if once_per_machine:
         machines = set()
-        worker_hostnames = {}
-        for address, name in all_worker_hostnames.items():
+        machine_workers = []
+        for address in workers:
             ip = address.split('://')[1].split(':')[0]
             if ip not in machines:
                 machines.add(ip)
-                worker_hostnames[address] = name
+                machine_workers.append(address)
+        workers = machine_workers
     
-    workers = list(worker_hostnames.keys())
     with Timer(f"Running {funcname} on {len(workers)} workers", logger):
-        results = client.run(func, workers=workers)
-    
-    if not return_hostnames:
-        return results
+        if not return_hostnames:
+            return client.run(func, workers=workers)
+
+        # Fetch each worker's hostname along with its result
+        results = client.run(_call_and_get_hostname, func, workers=workers)
 
     final_results = {}
-    for address, result in results.items():
-        hostname = worker_hostnames[address]
+    for address, (hostname, result) in results.items():
         ip = extract_ip_from_link(address)
         final_results[address.replace(ip, hostname)] = result
 
     return final_results
 
 
+def _call_and_get_hostname(func):
+    """
+    Helper for run_on_each_worker(), above.
+    """
+    return socket.gethostname(), func()
+
+
 def persist_and_execute(bag, description=None, logger=None, optimize_graph=True):
     """
     Persist and execute the given dask.Bag.
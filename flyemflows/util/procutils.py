@@ -135,11 +135,15 @@ def _try_kill(pid, sig, kill_children=False):
                 raise
 
 
-def _is_still_running_after_delay(pid, secs):
+def _is_still_running_after_delay(pid, secs, poll_interval=0.1):
+    """
+    Wait up to secs for the process to exit, checking every poll_interval.
+    Returns True if it's still running after that.
+    """
+    deadline = time.time() + secs
     still_running = is_process_running(pid)
-    while still_running and secs > 0.0:
-        time.sleep(2.0)
-        secs -= 2.0
+    while still_running and time.time() < deadline:
+        time.sleep(poll_interval)
         still_running = is_process_running(pid)
     return still_running
     
@@ -1,5 +1,4 @@
 import os
-import csv
 import warnings
 import subprocess
 
@@ -89,8 +88,8 @@ def load_labelmap(labelmap_config, working_dir):
             subprocess.check_call(cmd, shell=True)
         path = downloaded_path
 
-    if not labelmap_config["file"].startswith("/"):
-        path = os.path.normpath( os.path.join(working_dir, labelmap_config["file"]) )
+    if not os.path.isabs(path):
+        path = os.path.normpath( os.path.join(working_dir, path) )
 
     # Now path is /path/to/file.csv[.gz]
     
@@ -124,9 +123,7 @@ def load_labelmap(labelmap_config, working_dir):
         # Export mapping to disk in case anyone wants to view it later
         output_dir, basename = os.path.split(path)
         mapping_csv_path = f'{output_dir}/LABEL-TO-BODY-{basename}'
-        if not os.path.exists(mapping_csv_path):
-            with open(mapping_csv_path, 'w') as f:
-                csv.writer(f).writerows(mapping_pairs)
+        equivalence_mapping_to_csv(mapping_pairs, mapping_csv_path)
     else:
         raise RuntimeError(f"Unknown labelmap file-type: {labelmap_config['file-type']}")
 
@@ -315,8 +312,8 @@ def mapping_from_groups(groups):
 
 def equivalence_mapping_to_csv(mapping_pairs, output_path):
     if not os.path.exists(output_path):
-        with open(output_path, 'w') as f:
-            csv.writer(f).writerows(mapping_pairs)
+        # pandas writes the CSV in C, unlike csv.writer
+        pd.DataFrame(mapping_pairs).to_csv(output_path, header=False, index=False)
 
 def compare_mappings(old_mapping, new_mapping):
     """
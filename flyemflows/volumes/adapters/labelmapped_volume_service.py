@@ -35,7 +35,7 @@ class LabelmappedVolumeService(VolumeServiceWriter):
         validate(labelmap_config, LabelMapSchema, inject_defaults=True)
 
         # Convert relative path to absolute
-        if not labelmap_config["file"].startswith('gs://') and not labelmap_config["file"].startswith("/"):
+        if not labelmap_config["file"].startswith('gs://') and not os.path.isabs(labelmap_config["file"]):
             abspath = os.path.abspath(labelmap_config["file"])
             labelmap_config["file"] = abspath
         
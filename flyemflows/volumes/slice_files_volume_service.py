@@ -157,9 +157,13 @@ class SliceFilesVolumeService(VolumeServiceWriter):
         z_offset = box_zyx[0,0]
         yx_box = box_zyx[:,1:] - self.slice_corner_yx
 
+        slice_paths = [self._slice_fmt.format(z) for z in range(*box_zyx[:,0])]
+
+        # Let the OS fetch all slices concurrently while we decode them one by one.
+        prefetch_files(slice_paths)
+
         output = np.ndarray(shape=(box_zyx[1] - box_zyx[0]), dtype=self.dtype)
-        for z in range(*box_zyx[:,0]):
-            slice_path = self._slice_fmt.format(z)
+        for z, slice_path in zip(range(*box_zyx[:,0]), slice_paths):
             slice_data = np.array( Image.open(slice_path).convert("L") )
             output[z-z_offset] = slice_data[box_to_slicing(*yx_box)]
         return output
@@ -167,8 +171,13 @@ class SliceFilesVolumeService(VolumeServiceWriter):
 
     def write_subvolume(self, subvolume, offset_zyx, scale=0):
         slice_dir = os.path.dirname(self._slice_fmt)
-        if not os.path.exists(slice_dir):
-            os.makedirs(slice_dir, exist_ok=True)
+        try:
+            # Atomic create-or-detect: exactly one writer (the one
+            # that actually creates the directory) fixes its permissions.
+            os.makedirs(slice_dir)
+        except FileExistsError:
+            pass
+        else:
             os.system(f"chmod g+rw {slice_dir}")
             if platform.system() == "Linux":
                 # Set default permissions to be group-writable
@@ -187,6 +196,31 @@ class SliceFilesVolumeService(VolumeServiceWriter):
             Image.fromarray(z_slice).save(slice_path)
 
 
+def prefetch_files(paths):
+    """
+    Advise the OS that the given files will be read soon,
+    so it can start reading them into the page cache in the background.
+    (On a cold cache, this lets the disk service many reads at once,
+    instead of one synchronous read per file.)
+
+    This is only a hint; it's a no-op on platforms without posix_fadvise().
+    """
+    if not hasattr(os, 'posix_fadvise'):
+        return
+
+    for path in paths:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            # Missing files will produce a proper error when we actually try to read them.
+            continue
+
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+
+
 def determine_stack_attributes(slice_fmt):
     """
     Determine the shape and dtype of a stack of slices that already reside on disk.
@@ -24,6 +24,7 @@ import warnings
 import subprocess
 from collections import defaultdict
 from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from os.path import splitext, basename
 
 
@@ -42,8 +43,19 @@ from .base_schema import JOBQUEUE_CLUSTERS
 logger = logging.getLogger(__name__)
 USER = getpass.getuser()
 
-# driver_ip_addr = '127.0.0.1'
-driver_ip_addr = get_localhost_ip_address()
+_driver_ip_addr = None
+
+def get_driver_ip_addr():
+    """
+    Return the driver's IP address.
+    
+    Determined on first use (not at import time), since it may
+    require a DNS lookup that most callers never need.
+    """
+    global _driver_ip_addr
+    if _driver_ip_addr is None:
+        _driver_ip_addr = get_localhost_ip_address()
+    return _driver_ip_addr
 
 @contextmanager
 def environment_context(update_dict, workflow=None):
@@ -130,6 +142,13 @@ class LocalResourceManager:
                 raise RuntimeError(msg)
             return None
 
+        # Fail now if the script is missing, rather than letting the python
+        # subprocess die on its own while the workers wait for a server that never starts.
+        resource_manager_script = f"{sys.prefix}/bin/dvid_resource_manager"
+        if not os.path.isfile(resource_manager_script):
+            msg = f"Can't start the resource manager: {resource_manager_script} does not exist"
+            raise RuntimeError(msg)
+
         if cfg["config"]:
             tmpdir = f"/tmp/{USER}"
             os.makedirs(tmpdir, exist_ok=True)
@@ -141,13 +160,15 @@ class LocalResourceManager:
             config_arg = ''
         
         # Overwrite workflow config data so workers see our IP address.
-        cfg["server"] = server = driver_ip_addr
+        cfg["server"] = server = get_driver_ip_addr()
 
-        logger.info(f"Starting resource manager on the driver ({driver_ip_addr}:{port}, a.k.a {socket.gethostname()}:{port})")
+        logger.info(f"Starting resource manager on the driver ({server}:{port}, a.k.a {socket.gethostname()}:{port})")
         
-        python = sys.executable
-        cmd = f"{python} {sys.prefix}/bin/dvid_resource_manager {port} {config_arg}"
-        self.resource_server_process = subprocess.Popen(cmd, stderr=subprocess.STDOUT, shell=True)
+        # Launch directly (no intermediate shell process).
+        cmd = [sys.executable, resource_manager_script, str(port)]
+        if config_arg:
+            cmd.append(config_arg)
+        self.resource_server_process = subprocess.Popen(cmd, stderr=subprocess.STDOUT)
         return self.resource_server_process
 
 
@@ -196,16 +217,20 @@ class WorkerDaemons:
         os.makedirs(init_options["log-dir"], exist_ok=True)
 
         launch_delay = init_options["launch-delay"]
+
+        # Resolve these once, here on the driver, so the function
+        # we send to the workers only closes over what it needs.
+        script_path = init_options["script-path"]
+        script_name = splitext(basename(script_path))[0]
+        script_args = [str(a) for a in init_options["script-args"]]
+        log_dir = init_options["log-dir"]
         
         def launch_init_script():
-            script_name = splitext(basename(init_options["script-path"]))[0]
-            log_dir = init_options["log-dir"]
             hostname = socket.gethostname()
             log_file = open(f'{log_dir}/{script_name}-{hostname}.log', 'w')
 
             try:
-                script_args = [str(a) for a in init_options["script-args"]]
-                p = subprocess.Popen( [init_options["script-path"], *script_args],
+                p = subprocess.Popen( [script_path, *script_args],
                                       stdout=log_file, stderr=subprocess.STDOUT )
             except OSError as ex:
                 if ex.errno == 8: # Exec format error
@@ -217,23 +242,31 @@ class WorkerDaemons:
                 p.wait()
                 if p.returncode == 126:
                     raise RuntimeError("Permission Error: Worker initialization script is not executable: {}"
-                                       .format(init_options["script-path"]))
+                                       .format(script_path))
                 assert p.returncode == 0, \
                     "Worker initialization script ({}) failed with exit code: {}"\
-                    .format(init_options["script-path"], p.returncode)
+                    .format(script_path, p.returncode)
                 return None
 
             return p.pid
         
-        worker_init_pids = self.workflow.run_on_each_worker( launch_init_script,
-                                                             init_options["only-once-per-machine"],
-                                                             return_hostnames=False)
-
         driver_init_pid = None
-        if init_options["also-run-on-driver"]:
+        if not init_options["also-run-on-driver"]:
+            worker_init_pids = self.workflow.run_on_each_worker( launch_init_script,
+                                                                 init_options["only-once-per-machine"],
+                                                                 return_hostnames=False)
+        else:
             if self.workflow.config["cluster-type"] not in ("lsf", "sge"):
                 warnings.warn("Warning: You are using a local-cluster, yet your worker initialization specified 'also-run-on-driver'.")
-            driver_init_pid = launch_init_script()
+
+            # Launch on the driver while the workers launch theirs.
+            # (If launch-delay is -1, each launch waits for its script to finish.)
+            with ThreadPoolExecutor(1) as executor:
+                driver_future = executor.submit(launch_init_script)
+                worker_init_pids = self.workflow.run_on_each_worker( launch_init_script,
+                                                                     init_options["only-once-per-machine"],
+                                                                     return_hostnames=False)
+                driver_init_pid = driver_future.result()
         
         if launch_delay > 0:
             logger.info(f"Pausing after launching worker initialization scripts ({launch_delay} seconds).")
@@ -250,8 +283,9 @@ class WorkerDaemons:
         
         If they don't respond to SIGTERM, they'll be force-killed with SIGKILL after 10 seconds.
         """
-        launch_delay = self.workflow.config["worker-initialization"]["launch-delay"]
-        once_per_machine = self.workflow.config["worker-initialization"]["only-once-per-machine"]
+        init_options = self.workflow.config["worker-initialization"]
+        launch_delay = init_options["launch-delay"]
+        once_per_machine = init_options["only-once-per-machine"]
         
         if launch_delay == -1:
             # Nothing to do:
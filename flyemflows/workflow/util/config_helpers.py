@@ -45,7 +45,8 @@ def load_body_list(config_data, is_supervoxels):
         col = 'body'
     
     if col in read_csv_header(bodies_csv):
-        bodies = pd.read_csv(bodies_csv)[col].drop_duplicates()
+        # Don't bother parsing the other columns (if any)
+        bodies = pd.read_csv(bodies_csv, usecols=[col])[col].drop_duplicates()
     else:
         # Just read the first column, no matter what it's named
         logger.warning(f"No column named {col}, so reading first column instead")
@@ -5,7 +5,6 @@ import json
 import logging
 logger = logging.getLogger(__name__)
 
-import requests
 from enum import Enum
 import numpy as np
 
@@ -87,7 +86,8 @@ def create_keyvalue_instance(server, uuid, instance_name, compression=None, tags
     if not server.startswith("http://"):
         server = "http://" + server
 
-    r = requests.get(f"{server}/api/node/{uuid}/{instance_name}/info")
+    session = default_dvid_session()
+    r = session.get(f"{server}/api/node/{uuid}/{instance_name}/info")
     if r.status_code == 200:
         if allow_prexisting:
             return False
@@ -107,7 +107,7 @@ def create_keyvalue_instance(server, uuid, instance_name, compression=None, tags
     if tags:
         body["Tags"] = ','.join(tags)
     
-    r = requests.post(f"{server}/api/repo/{uuid}/instance", json=body)
+    r = session.post(f"{server}/api/repo/{uuid}/instance", json=body)
     r.raise_for_status()
     return True
 
@@ -124,12 +124,13 @@ def extend_with_default(validator_class):
 
     def set_defaults_and_validate(validator, properties, instance, schema):
         for property, subschema in properties.items():
-            if "default" in subschema:
+            # Only copy the default if we're actually going to use it.
+            if "default" in subschema and property not in instance:
                 default = copy.deepcopy(subschema["default"])
                 if isinstance(default, dict):
                     default = Dict(default)
                     default.from_default = True
-                instance.setdefault(property, default)
+                instance[property] = default
 
         for error in validate_properties(validator, properties, instance, schema):
             yield error
@@ -138,6 +139,10 @@ def extend_with_default(validator_class):
 
 DefaultValidatingDraft4Validator = extend_with_default(Draft4Validator)
 
+# Caches for validate(), below.
+_checked_schemas = {}
+_default_injecting_validators = { Draft4Validator: DefaultValidatingDraft4Validator }
+
 def validate(instance, schema, cls=None, *args, inject_defaults=False, **kwargs):
     """
     Drop-in replacement for jsonschema.validate(), with the following extended functionality:
@@ -151,11 +156,21 @@ def validate(instance, schema, cls=None, *args, inject_defaults=False, **kwargs)
     """
     if cls is None:
         cls = validators.validator_for(schema)
-    cls.check_schema(schema)
+
+    # Checking a schema against its metaschema is relatively expensive,
+    # and our schemas are usually module-level constants, so only check each one once.
+    # (The cache holds a reference to each schema, so its id() can't be reused.)
+    if _checked_schemas.get((cls, id(schema))) is not schema:
+        cls.check_schema(schema)
+        _checked_schemas[(cls, id(schema))] = schema
 
     if inject_defaults:
         # Add default-injection behavior to the validator
-        cls = extend_with_default(cls)
+        # (Creating the extended class is also expensive, so cache it.)
+        try:
+            cls = _default_injecting_validators[cls]
+        except KeyError:
+            cls = _default_injecting_validators[cls] = extend_with_default(cls)
     
     # By default, jsonschema expects JSON objects to be of type 'dict'.
     # We also want to permit ruamel.yaml.comments.CommentedSeq and CommentedMap
@@ -19,6 +19,7 @@ from DVIDSparkServices.sparkdvid.sparkdvid import retrieve_node_service
 from DVIDSparkServices.util import zip_many, select_item, dense_roi_mask_for_subvolume
 from DVIDSparkServices.sparkdvid.Subvolume import Subvolume
 from DVIDSparkServices.subprocess_decorator import execute_in_subprocess
+from DVIDSparkServices.reconutils.morpho import overlap_counts
 
 class Segmentor(object):
     """
@@ -135,14 +136,17 @@ class Segmentor(object):
         }
         """)
 
+    # Parse the schema once, at import.  Validating against the same
+    # dict every time also lets json_util skip re-checking the schema.
+    _segmentor_schema = json.loads(SegmentorSchema)
+
     def __init__(self, context, workflow):
         self.context = context
         self.workflow = workflow
         workflow_config = workflow.config_data
         self.segmentor_config = workflow_config["options"]["segmentor"]["configuration"]
 
-        segmentor_schema = json.loads(Segmentor.SegmentorSchema)
-        validate_and_inject_defaults(self.segmentor_config, segmentor_schema)        
+        validate_and_inject_defaults(self.segmentor_config, Segmentor._segmentor_schema)
 
         stitch_modes = { "none" : 0, "conservative" : 1, "medium" : 2, "aggressive" : 3 }
         self.stitch_mode = stitch_modes[ workflow_config["options"]["stitch-algorithm"] ]
@@ -177,6 +181,11 @@ class Segmentor(object):
             segmentation (RDD) as (subvolume key, (subvolume, numpy compressed array))
 
         """
+        checkpoint_dirs = (gray_checkpoint_dir, mask_checkpoint_dir, pred_checkpoint_dir, sp_checkpoint_dir, seg_checkpoint_dir)
+        if not any(checkpoint_dirs) and not self._has_overridden_steps():
+            # No intermediate results need to be cached, so run all steps at once.
+            return self.segment_fused(subvols_rdd, gray_blocks)
+
         # Developers might set gray_checkpoint_dir while debugging.
         # In that case, force the grayscale data to get written to cache.
         if gray_checkpoint_dir:
@@ -200,6 +209,41 @@ class Segmentor(object):
         
         return seg_blocks
 
+    def segment_fused(self, subvols_rdd, gray_blocks):
+        """
+        Equivalent to segment() without any checkpoint directories,
+        but all four steps (background mask, voxel prediction, supervoxels, agglomeration)
+        are executed within a single map() for each subvolume.
+
+        The intermediate volumes are passed directly from one step to the next,
+        rather than being persisted (i.e. pickled and compressed) between steps.
+        """
+        mask_function = self._background_mask_chunk_function("")
+        prediction_function = self._predict_voxels_chunk_function("", False)
+        supervoxel_function = self._create_supervoxels_chunk_function("", False)
+        agglomeration_function = self._agglomerate_supervoxels_chunk_function("", False)
+
+        def _execute_for_chunk(args):
+            subvolume, gray = args
+            mask = mask_function( (subvolume, gray) )
+            predictions = prediction_function( (subvolume, (gray, mask)) )
+            supervoxels = supervoxel_function( (subvolume, (predictions, mask)) )
+            del mask
+            return agglomeration_function( (subvolume, (gray, predictions, supervoxels)) )
+
+        # preserve partitioner
+        return subvols_rdd.zip(gray_blocks).map(_execute_for_chunk, True)
+
+    def _has_overridden_steps(self):
+        """
+        Return True if a subclass has overridden any of the individual
+        segmentation steps, in which case segment_fused() can't be used.
+        """
+        for step in ('compute_background_mask', 'predict_voxels', 'create_supervoxels', 'agglomerate_supervoxels'):
+            if getattr(type(self), step) is not getattr(Segmentor, step):
+                return True
+        return False
+
     @classmethod
     def use_block_cache(cls, blockstore_dir, allow_read=True, allow_write=True, dset_options={'compression': 'gzip', 'shuffle': True}):
         """
@@ -322,6 +366,10 @@ class Segmentor(object):
                       which, by convention, means "everything is foreground".
                       (This saves RAM in the common case.)
         """
+        chunk_function = self._background_mask_chunk_function(mask_checkpoint_dir)
+        return subvols.zip(gray_vols).map(chunk_function, True)
+
+    def _background_mask_chunk_function(self, mask_checkpoint_dir):
         mask_function = self._get_segmentation_function('background-mask')
 
         @self.workflow.collect_log(lambda sv_g1: str(sv_g1[0]))
@@ -351,7 +399,7 @@ class Segmentor(object):
 
             return data_mask
 
-        return subvols.zip(gray_vols).map(_execute_for_chunk, True)
+        return _execute_for_chunk
 
     def predict_voxels(self, subvols, gray_blocks, mask_blocks, pred_checkpoint_dir, allow_pred_rollback):
         """Create a dummy placeholder boundary channel from grayscale.
@@ -359,6 +407,10 @@ class Segmentor(object):
         Takes an RDD of grayscale numpy volumes and produces
         an RDD of predictions (z,y,x).
         """
+        chunk_function = self._predict_voxels_chunk_function(pred_checkpoint_dir, allow_pred_rollback)
+        return subvols.zip( gray_blocks.zip(mask_blocks) ).map(chunk_function, True)
+
+    def _predict_voxels_chunk_function(self, pred_checkpoint_dir, allow_pred_rollback):
         prediction_function = self._get_segmentation_function('predict-voxels')
 
         @self.workflow.collect_log(lambda sv_g_mc: str(sv_g_mc[0]))
@@ -382,8 +434,8 @@ class Segmentor(object):
             #predictions = predictions * 100
             #predictions = predictions.astype(numpy.uint8)
             return predictions
-             
-        return subvols.zip( gray_blocks.zip(mask_blocks) ).map(_execute_for_chunk, True)
+
+        return _execute_for_chunk
 
     def create_supervoxels(self, subvols, pred_blocks, mask_blocks, sp_checkpoint_dir, allow_sp_rollback):
         """Performs watershed based on voxel prediction.
@@ -403,6 +455,10 @@ class Segmentor(object):
             watershed+predictions (RDD) as (subvolume key, (subvolume, 
                 (numpy compressed array, numpy compressed array)))
         """
+        chunk_function = self._create_supervoxels_chunk_function(sp_checkpoint_dir, allow_sp_rollback)
+        return subvols.zip( pred_blocks.zip(mask_blocks) ).map(chunk_function, True)
+
+    def _create_supervoxels_chunk_function(self, sp_checkpoint_dir, allow_sp_rollback):
         supervoxel_function = self._get_segmentation_function('create-supervoxels')
 
         pdconf = self.pdconf
@@ -484,7 +540,7 @@ class Segmentor(object):
             
             return supervoxels
 
-        return subvols.zip( pred_blocks.zip(mask_blocks) ).map(_execute_for_chunk, True)
+        return _execute_for_chunk
 
     def agglomerate_supervoxels(self, subvols, gray_blocks, pred_blocks, sp_blocks, seg_checkpoint_dir, allow_seg_rollback):
         """Agglomerate supervoxels
@@ -498,7 +554,12 @@ class Segmentor(object):
         Returns:
             segmentation (RDD) = (subvolume key, (subvolume, numpy compressed array))
         """
-        
+        chunk_function = self._agglomerate_supervoxels_chunk_function(seg_checkpoint_dir, allow_seg_rollback)
+
+        # preserve partitioner
+        return subvols.zip( zip_many(gray_blocks, pred_blocks, sp_blocks) ).map(chunk_function, True)
+
+    def _agglomerate_supervoxels_chunk_function(self, seg_checkpoint_dir, allow_seg_rollback):
         agglomeration_function = self._get_segmentation_function('agglomerate-supervoxels')
 
         pdconf = self.pdconf
@@ -545,8 +606,7 @@ class Segmentor(object):
 
             return agglomerated
 
-        # preserve partitioner
-        return subvols.zip( zip_many(gray_blocks, pred_blocks, sp_blocks) ).map(_execute_for_chunk, True)
+        return _execute_for_chunk
     
 
     # label volumes to label volumes remapped, preserves partitioner 
@@ -556,12 +616,21 @@ class Segmentor(object):
                               (subvol, (seg_vol, max_id)),
                               ... ]
 
-        Note: This function requires that label_chunks is already persist()ed in memory.
+        Note: label_chunks is used several times below, so it must be persisted.
+              If the caller hasn't already persist()ed it, it will be persisted here,
+              and the caller is responsible for unpersisting it when the result is no longer needed.
         """
-        assert label_chunks.is_cached, "You must persist() label_chunks before calling this function."
+        if not label_chunks.is_cached:
+            from pyspark import StorageLevel
+            label_chunks.persist(StorageLevel.MEMORY_AND_DISK)
         subvolumes_rdd = select_item(label_chunks, 0)
-        subvolumes = subvolumes_rdd.collect()
-        max_ids = select_item(label_chunks, 1, 1).collect()
+
+        # Only the (sv_index, max_id) pairs are needed on the driver,
+        # so don't bother sending the full Subvolume objects.
+        def index_and_max_id(item):
+            subvolume, (_seg, max_id) = item
+            return (subvolume.sv_index, max_id)
+        sv_max_ids = label_chunks.map(index_and_max_id).collect()
 
         # return all subvolumes back to the driver
         # create offset map (substack id => offset) and broadcast
@@ -575,8 +644,8 @@ class Segmentor(object):
         if pdconf is not None:
             num_preserve = len(pdconf["bodies"])
         
-        for subvolume, max_id in zip(subvolumes, max_ids):
-            offsets[subvolume.sv_index] = offset
+        for sv_index, max_id in sv_max_ids:
+            offsets[sv_index] = offset
             offset += max_id
             offset += num_preserve
         subvolume_offsets = self.context.sc.broadcast(offsets)
@@ -587,9 +656,6 @@ class Segmentor(object):
         def extract_boundaries(key_labels):
             # compute overlap -- assume first point is less than second
             def intersects(pt1, pt2, pt1_2, pt2_2):
-                assert pt1 <= pt2, "point 1 greater than point 2: {} > {}".format( pt1, pt2 )
-                assert pt1_2 <= pt2_2, "point 1_2 greater than point 2_2: {} > {}".format( pt1_2, pt2_2 )
-
                 val1 = max(pt1, pt1_2)
                 val2 = min(pt2, pt2_2)
                 size = val2-val1
@@ -650,7 +716,12 @@ class Segmentor(object):
                                 box2.z2+subvolume.border
                             )
                             
-                labels_cropped = numpy.copy(labels[offz1:offz2, offy1:offy2, offx1:offx2])
+                # Copy the crop, so the emitted boundary doesn't keep the whole
+                # label volume alive while the shuffle buffers it.
+                # (No copy needed if the crop is the whole volume anyway.)
+                labels_cropped = labels[offz1:offz2, offy1:offy2, offx1:offx2]
+                if labels_cropped.shape != labels.shape:
+                    labels_cropped = labels_cropped.copy()
 
                 # extract constraint graph
                 graph_edges_sub = None
@@ -677,10 +748,6 @@ class Segmentor(object):
         label_vols_rdd = select_item(label_chunks, 1, 0)
         mapped_boundaries = subvolumes_rdd.zip(label_vols_rdd).flatMap(extract_boundaries) 
 
-        # shuffle the hopefully smallish boundaries into their proper spot
-        # groupby is not a big deal here since same keys will not be in the same partition
-        grouped_boundaries = mapped_boundaries.groupByKey()
-
         stitch_mode = self.stitch_mode
 
         # mappings to one partition (larger/second id keeps orig labels)
@@ -710,28 +777,25 @@ class Segmentor(object):
                 raise Exception("Extracted boundaries are different shapes")
             
             # determine list of bodies in play
-            z2, y2, x2 = boundary1.shape
-            z1 = y1 = x1 = 0 
-
-            # determine which interface there is touching between subvolumes 
-            if subvolume1.touches(subvolume1.box.x1, subvolume1.box.x2,
-                                  subvolume2.box.x1, subvolume2.box.x2):
-                x1 = x2 // 2 
-                x2 = x1 + 1
-            if subvolume1.touches(subvolume1.box.y1, subvolume1.box.y2,
-                                  subvolume2.box.y1, subvolume2.box.y2):
-                y1 = y2 // 2 
-                y2 = y1 + 1
-            
-            if subvolume1.touches(subvolume1.box.z1, subvolume1.box.z2,
-                                  subvolume2.box.z1, subvolume2.box.z2):
-                z1 = z2 // 2 
-                z2 = z1 + 1
+            interface = interface_slicing(subvolume1, subvolume2, boundary1.shape)
+            eligible_bodies = set(numpy.unique(boundary2[interface]))
 
-            eligible_bodies = set(numpy.unique(boundary2[z1:z2, y1:y2, x1:x2]))
-            body2body = {}
+            # Count overlapping voxels for each (body1, body2) pair once;
+            # both passes below use the same counts, grouped differently.
+            if stitch_mode > 0:
+                overlap_body1, overlap_body2, overlap_sizes = overlap_counts(boundary1, boundary2)
 
-            label2_bodies = numpy.unique(boundary2)
+                # Every nonzero body is considered, including those with no overlap at all
+                # (which are counted in small_overlap_prune, below).
+                label1_bodies = numpy.unique(boundary1)
+                label1_bodies = label1_bodies[label1_bodies != 0]
+                label2_bodies = numpy.unique(boundary2)
+                label2_bodies = label2_bodies[label2_bodies != 0]
+
+                best_body1_for_body2 = zip(*(a.tolist() for a in best_overlap_partners(overlap_body2, overlap_body1, overlap_sizes, label2_bodies)))
+                best_body2_for_body1 = zip(*(a.tolist() for a in best_overlap_partners(overlap_body1, overlap_body2, overlap_sizes, label1_bodies)))
+            else:
+                best_body1_for_body2 = best_body2_for_body1 = []
 
             # 0 is off,
             # 1 is very conservative (high percentages and no bridging),
@@ -742,23 +806,6 @@ class Segmentor(object):
             liberal_lb = 1000
             conservative_overlap = 0.90
 
-            if stitch_mode > 0:
-                for body in label2_bodies:
-                    if body == 0:
-                        continue
-                    body2body[body] = {}
-
-                # traverse volume to find maximum overlap
-                for (z,y,x), body1 in numpy.ndenumerate(boundary1):
-                    body2 = boundary2[z,y,x]
-                    if body2 == 0 or body1 == 0:
-                        continue
-                    
-                    if body1 not in body2body[body2]:
-                        body2body[body2][body1] = 0
-                    body2body[body2][body1] += 1
-
-
             # create merge list 
             merge_list = []
             mutual_list = {}
@@ -769,17 +816,9 @@ class Segmentor(object):
             aggressive_add = 0
             not_mutual = 0
 
-            for body2, bodydict in body2body.items():
+            for body2, bodysave, max_val, total_val in best_body1_for_body2:
                 if body2 in eligible_bodies:
-                    bodysave = -1
-                    max_val = hard_lb
-                    total_val = 0
-                    for body1, val in bodydict.items():
-                        total_val += val
-                        if val > max_val:
-                            bodysave = body1
-                            max_val = val
-                    if bodysave == -1:
+                    if max_val <= hard_lb:
                         small_overlap_prune += 1
                     elif (stitch_mode == 1) and (max_val / float(total_val) < conservative_overlap):
                         conservative_prune += 1
@@ -792,44 +831,17 @@ class Segmentor(object):
                         if int(bodysave) not in mutual_list:
                             mutual_list[int(bodysave)] = {}
                         mutual_list[int(bodysave)][int(body2)] = max_val
-                       
-
-            eligible_bodies = set(numpy.unique(boundary1[z1:z2, y1:y2, x1:x2]))
-            body2body = {}
-            
-            if stitch_mode > 0:
-                label1_bodies = numpy.unique(boundary1)
-                for body in label1_bodies:
-                    if body == 0:
-                        continue
-                    body2body[body] = {}
 
-                # traverse volume to find maximum overlap
-                for (z,y,x), body1 in numpy.ndenumerate(boundary1):
-                    body2 = boundary2[z,y,x]
-                    if body2 == 0 or body1 == 0:
-                        continue
-                    if body2 not in body2body[body1]:
-                        body2body[body1][body2] = 0
-                    body2body[body1][body2] += 1
+            eligible_bodies = set(numpy.unique(boundary1[interface]))
             
             # add to merge list 
-            for body1, bodydict in body2body.items():
+            for body1, bodysave, max_val, total_val in best_body2_for_body1:
                 if body1 in eligible_bodies:
-                    bodysave = -1
-                    max_val = hard_lb
-                    total_val = 0
-                    for body2, val in bodydict.items():
-                        total_val += val
-                        if val > max_val:
-                            bodysave = body2
-                            max_val = val
-
-                    if (int(body1), int(bodysave)) in retired_list:
+                    if max_val <= hard_lb:
+                        small_overlap_prune += 1
+                    elif (int(body1), int(bodysave)) in retired_list:
                         # already in list
                         pass
-                    elif bodysave == -1:
-                        small_overlap_prune += 1
                     elif (stitch_mode == 1) and (max_val / float(total_val) < conservative_overlap):
                         conservative_prune += 1
                     elif (stitch_mode == 3) and (max_val / float(total_val) > conservative_overlap) and (max_val > liberal_lb):
@@ -1006,8 +1018,15 @@ class Segmentor(object):
                 # return id and mappings, only relevant for stack one
                 return (subvolume1.sv_index, merge_list)
 
+        # Bring the two sides of each boundary together.
+        grouped_boundaries = mapped_boundaries.groupByKey()
+
         merge_list = []
-        if stitch_constraints:
+        if stitch_mode == 0:
+            # Stitching is disabled, so the stitcher can't produce any mergers.
+            # Don't bother extracting and shuffling the boundary volumes at all.
+            pass
+        elif stitch_constraints:
             current_decisions = grouped_boundaries.flatMap(stitcher)
             
             def combine_decisions(dec1, dec2):
@@ -1228,30 +1247,7 @@ class Segmentor(object):
                 merge_list.extend(mapping)
 
         # make a body2body map
-        body1body2 = {}
-        body2body1 = {}
-
-        for merger in merge_list:
-            # body1 -> body2
-            body1 = merger[0]
-            if merger[0] in body1body2:
-                body1 = body1body2[merger[0]]
-            body2 = merger[1]
-            if merger[1] in body1body2:
-                body2 = body1body2[merger[1]]
-
-            if body2 not in body2body1:
-                body2body1[body2] = set()
-            
-            # add body1 to body2 map
-            body2body1[body2].add(body1)
-            # add body1 -> body2 mapping
-            body1body2[body1] = body2
-
-            if body1 in body2body1:
-                for tbody in body2body1[body1]:
-                    body2body1[body2].add(tbody)
-                    body1body2[tbody] = body2
+        body1body2 = merge_representatives(merge_list)
 
         # avoid renumbering bodies that are to be preserved from previous segmentation
         if self.preserve_bodies is not None:
@@ -1270,11 +1266,14 @@ class Segmentor(object):
                         self.preserve_bodies.add(newval)
                     body1body2[key] = relabelconfs[val]
 
-        body2body = list(zip(body1body2.keys(), body1body2.values()))
-       
-        # potentially costly broadcast
-        # (possible to split into substack to make more efficient but compression should help)
-        master_merge_list = self.context.sc.broadcast(body2body)
+        # Broadcast the mapping as a single contiguous array of shape (2,N):
+        # row 0 holds the 'from' bodies (sorted, so workers can use searchsorted())
+        # and row 1 holds the bodies they map to.
+        mapping_array = np.empty((2, len(body1body2)), np.uint64)
+        mapping_array[0] = np.fromiter(body1body2.keys(), np.uint64, len(body1body2))
+        mapping_array[1] = np.fromiter(body1body2.values(), np.uint64, len(body1body2))
+        mapping_array = mapping_array[:, np.argsort(mapping_array[0])]
+        master_mapping = self.context.sc.broadcast(mapping_array)
 
         # use offset and mappings to relabel volume
         def relabel(key_label_mapping):
@@ -1319,22 +1318,29 @@ class Segmentor(object):
                     relabeled_bodies[body] = curr_id
                     curr_id += 1
 
-            # create default map 
-            labels_view = vigra.taggedView(labels.astype(numpy.uint64), 'zyx')
-            mapping_col = numpy.sort( vigra.analysis.unique(labels_view) )
-            label_mappings = dict(zip(mapping_col, mapping_col))
-           
-            # create maps from merge list
-            for mapping in master_merge_list.value:
-                if mapping[0] in label_mappings:
-                    label_mappings[mapping[0]] = mapping[1]
-                elif mapping[0] in relabeled_bodies:
-                    label_mappings[relabeled_bodies[mapping[0]]] = mapping[1]
+            # create default map (sorted unique labels map to themselves)
+            unique_labels, inverse = numpy.unique(labels, return_inverse=True)
+            mapped_labels = unique_labels.astype(numpy.uint64)
+
+            # apply the merge mapping to the labels in this subvolume
+            merge_from, merge_to = master_mapping.value
+            if len(merge_from) > 0:
+                positions = numpy.searchsorted(merge_from, mapped_labels)
+                positions[positions == len(merge_from)] = 0
+                found = (merge_from[positions] == mapped_labels)
+                mapped_labels[found] = merge_to[positions[found]]
+
+                for body, new_body in relabeled_bodies.items():
+                    # If the original body is still a local label, its own
+                    # mapping (applied above) takes precedence over this one.
+                    if body in unique_labels or new_body not in unique_labels:
+                        continue
+                    position = numpy.searchsorted(merge_from, body)
+                    if position < len(merge_from) and merge_from[position] == body:
+                        mapped_labels[numpy.searchsorted(unique_labels, new_body)] = merge_to[position]
 
             # apply maps
-            new_labels = numpy.empty_like( labels, dtype=numpy.uint64 )
-            new_labels_view = vigra.taggedView(new_labels, 'zyx')
-            vigra.analysis.applyMapping(labels_view, label_mappings, allow_incomplete_mapping=True, out=new_labels_view)
+            new_labels = mapped_labels[inverse].reshape(labels.shape)
             return (subvolume, new_labels)
 
         # just map values with broadcast map
@@ -1344,3 +1350,117 @@ class Segmentor(object):
         return subvolumes_rdd.zip(label_vols_rdd).map(relabel)
 
 
+def best_overlap_partners(bodies, partners, counts, all_bodies=None):
+    """
+    Given the overlap counts between pairs of bodies (e.g. from overlap_counts()),
+    find the partner with the largest overlap for each body.
+    In case of ties, the partner that appears first in the input wins.
+
+    If all_bodies (sorted, unique) is given, the results cover exactly those bodies.
+    Bodies that don't appear in the overlap counts are reported with partner 0
+    and counts of 0.
+
+    Returns:
+        (unique_bodies, best_partners, best_counts, total_counts),
+        four 1D arrays, sorted by body.
+    """
+    order = np.lexsort((np.arange(len(bodies)), -counts, bodies))
+    bodies, partners, counts = bodies[order], partners[order], counts[order]
+
+    unique_bodies, group_starts = np.unique(bodies, return_index=True)
+    if len(counts) == 0:
+        total_counts = counts[:0]
+    else:
+        total_counts = np.add.reduceat(counts, group_starts)
+    best_partners = partners[group_starts]
+    best_counts = counts[group_starts]
+
+    if all_bodies is None:
+        return unique_bodies, best_partners, best_counts, total_counts
+
+    all_bodies = np.asarray(all_bodies)
+    positions = np.searchsorted(unique_bodies, all_bodies)
+    found = np.zeros(len(all_bodies), bool)
+    in_range = positions < len(unique_bodies)
+    found[in_range] = (unique_bodies[positions[in_range]] == all_bodies[in_range])
+
+    def expand(values):
+        expanded = np.zeros(len(all_bodies), values.dtype)
+        expanded[found] = values[positions[found]]
+        return expanded
+
+    return all_bodies, expand(best_partners), expand(best_counts), expand(total_counts)
+
+
+def interface_slicing(subvolume1, subvolume2, boundary_shape):
+    """
+    For the boundary volume shared by two neighboring subvolumes,
+    return the slicing (zyx) of the 1-voxel-thick plane at the center of
+    the boundary along each axis in which the subvolumes touch.
+    """
+    slicing = []
+    for axis, length in zip('zyx', boundary_shape):
+        start1, stop1 = getattr(subvolume1.box, axis + '1'), getattr(subvolume1.box, axis + '2')
+        start2, stop2 = getattr(subvolume2.box, axis + '1'), getattr(subvolume2.box, axis + '2')
+        if subvolume1.touches(start1, stop1, start2, stop2):
+            middle = length // 2
+            slicing.append(slice(middle, middle+1))
+        else:
+            slicing.append(slice(0, length))
+    return tuple(slicing)
+
+
+def merge_representatives(merge_list):
+    """
+    Given a list of [body1, body2] merge decisions, determine the final
+    body that each merged body should be mapped to.
+
+    Each merge joins body1's group into body2's group, so the merged
+    group takes on the representative of body2's group.
+    
+    Implemented via union-find (with path compression and union-by-rank),
+    so the cost is nearly linear in the number of merges.
+    
+    Returns:
+        dict of {body: representative}, omitting bodies that map to themselves.
+    """
+    parent = {}
+    rank = {}
+    representative = {} # root -> representative body of its group
+
+    def find(body):
+        if body not in parent:
+            parent[body] = body
+            rank[body] = 0
+            representative[body] = body
+            return body
+
+        root = body
+        while parent[root] != root:
+            root = parent[root]
+
+        # path compression
+        while parent[body] != root:
+            parent[body], body = root, parent[body]
+        return root
+
+    for body1, body2 in merge_list:
+        root1 = find(body1)
+        root2 = find(body2)
+        if root1 == root2:
+            continue
+
+        group_rep = representative[root2]
+        if rank[root1] > rank[root2]:
+            root1, root2 = root2, root1
+        elif rank[root1] == rank[root2]:
+            rank[root2] += 1
+        parent[root1] = root2
+        representative[root2] = group_rep
+
+    mapping = {}
+    for body in parent:
+        group_rep = representative[find(body)]
+        if group_rep != body:
+            mapping[body] = group_rep
+    return mapping
@@ -299,9 +299,17 @@ class Evaluate(object):
 
         # TODO combine labels with relevant points 
         #lpairs_split = lpairs_split.join(distpoints)
+
+        point_type = point_data["type"]
+        point_sparse = point_data["sparse"]
+
+        # Send the (possibly large) point list to each executor once,
+        # instead of pickling it into every task's closure.
+        point_list_bc = lpairs_split.context.broadcast(point_data["point-list"])
         
         def _calcoverlap_pts(label_pairs):
             stats, labelgt_map, label2_map, labelgt, label2 = label_pairs
+            point_list = point_list_bc.value
 
             # for connected points, connections are encoded by using
             # the position index number X and extra numbers Y1,Y2... indicating
@@ -315,7 +323,7 @@ class Evaluate(object):
             subvolume_pts = {}
             box = stats.subvolumes[0].box
             # grab points that overlap
-            for index, point in enumerate(point_data["point-list"]):
+            for index, point in enumerate(point_list):
                 if point[0] < box.x2 and point[0] >= box.x1 and point[1] < box.y2 and point[1] >= box.y1 and point[2] < box.z2 and point[2] >= box.z1:
                     subvolume_pts[index] = [point[0]-box.x1, point[1]-box.y1, point[2]-box.z1]
                     adjacency_list[index] = set()
@@ -323,7 +331,7 @@ class Evaluate(object):
                         adjacency_list[index].add(point[iter1])
 
             # find points that have a parent (connection) outside of subvolume
-            for index, point in enumerate(point_data["point-list"]):
+            for index, point in enumerate(point_list):
                 if point[0] >= box.x2 or point[0] < box.x1 or point[1] >= box.y2 or point[1] < box.y1 or point[2] >= box.z2 or point[2] < box.z1:
                     for iter1 in range(3, len(point)):
                         if point[iter1] in adjacency_list:
@@ -380,7 +388,7 @@ class Evaluate(object):
                     comparison_type, labelgt_map, label2_map)
 
             # if synapse type load total pair matches (save boundary point deps) 
-            if point_data["type"] == "synapse":
+            if point_type == "synapse":
                 # grab partial connectivity graph for gt
                 #gt_overlap_syn, leftover_gt = \
                 #    self._extract_subvolume_connections(index2body_gt, parent_list, adjacency_list)
@@ -388,7 +396,7 @@ class Evaluate(object):
                 # add custom synapse type
                 #stats.add_gt_overlap(SynOverlapTable(gt_overlap_syn,
                 #        ComparisonType("synapse-graph", str(point_list_name),
-                #        point_data["sparse"]), leftover_gt))
+                #        point_sparse), leftover_gt))
 
                 # grab partial connectivity graph for seg
                 #seg_overlap_syn, leftover_seg = \
@@ -398,7 +406,7 @@ class Evaluate(object):
                 # add custom synapse type
                 #stats.add_seg_overlap(SynOverlapTable(seg_overlap_syn,
                 #        ComparisonType("synapse-graph", str(point_list_name),
-                #        point_data["sparse"]), leftover_seg))
+                #        point_sparse), leftover_seg))
     
                 # add table showing intersection of gtseg
                 gtseg_overlap_syn, leftover_gtseg = \
@@ -408,12 +416,12 @@ class Evaluate(object):
                 # add custom synapse type
                 stats.add_gt_overlap(SynOverlapTable(gtseg_overlap_syn,
                         ComparisonType("synapse-graph-gtseg", str(point_list_name),
-                        point_data["sparse"]), leftover_gtseg))
+                        point_sparse), leftover_gtseg))
                
                 # add dummy placeholder (TODO: refactor segstats to avoid this)
                 stats.add_seg_overlap(SynOverlapTable([],
                         ComparisonType("synapse-graph-gtseg", str(point_list_name),
-                        point_data["sparse"]), ({}, {})))
+                        point_sparse), ({}, {})))
 
             # points no longer needed
             return (stats, labelgt_map, label2_map, labelgt, label2)
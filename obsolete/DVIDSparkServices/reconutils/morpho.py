@@ -9,6 +9,8 @@ import numpy
 import numpy as np
 import pandas as pd
 import vigra
+from numba import jit, types
+from numba.typed import Dict
 
 from dvidutils import LabelMapper
 
@@ -335,9 +337,6 @@ def stitch(sc, label_chunks):
     def extract_boundaries(key_labels):
         # compute overlap -- assume first point is less than second
         def intersects(pt1, pt2, pt1_2, pt2_2):
-            assert pt1 <= pt2, "point 1 greater than point 2: {} > {}".format( pt1, pt2 )
-            assert pt1_2 <= pt2_2, "point 1_2 greater than point 2_2: {} > {}".format( pt1_2, pt2_2 )
-
             val1 = max(pt1, pt1_2)
             val2 = min(pt2, pt2_2)
             size = val2-val1
@@ -447,35 +446,18 @@ def stitch(sc, label_chunks):
             z2 = z1 + 1
 
         eligible_bodies = set(numpy.unique(boundary2[z1:z2, y1:y2, x1:x2]))
-        body2body = {}
-
-        label2_bodies = numpy.unique(boundary2)
-
-        for body in label2_bodies:
-            if body == 0:
-                continue
-            body2body[body] = {}
-
-        # traverse volume to find maximum overlap
-        for (z,y,x), body1 in numpy.ndenumerate(boundary1):
-            body2 = boundary2[z,y,x]
-            if body2 == 0 or body1 == 0:
-                continue
-            
-            if body1 not in body2body[body2]:
-                body2body[body2][body1] = 0
-            body2body[body2][body1] += 1
 
+        # find all overlapping pairs (grouped by body2)
+        overlap_body1, overlap_body2, _counts = overlap_counts(boundary1, boundary2)
+        order = numpy.argsort(overlap_body2, kind='stable')
 
         # create merge list 
         merge_list = []
 
         # merge if any overlap
-        for body2, bodydict in body2body.items():
+        for body1, body2 in zip(overlap_body1[order].tolist(), overlap_body2[order].tolist()):
             if body2 in eligible_bodies:
-                for body1, val in bodydict.items():
-                    if val > 0:
-                        merge_list.append([int(body1), int(body2)])
+                merge_list.append([body1, body2])
                    
 
         # handle offsets in mergelist
@@ -573,3 +555,55 @@ def stitch(sc, label_chunks):
     return subvolumes_rdd.zip(label_vols_rdd).map(relabel)
 
 
+def overlap_counts(labels1, labels2):
+    """
+    Count the voxels of overlap between each pair of nonzero labels
+    in two label volumes of the same shape.
+
+    Returns:
+        (body1, body2, counts), three 1D arrays of equal length,
+        with one entry for each overlapping (body1, body2) pair,
+        in the order the pairs are first encountered in the volume.
+    """
+    assert labels1.shape == labels2.shape
+    assert labels1.dtype == labels2.dtype
+    labels1 = np.ascontiguousarray(labels1).reshape(-1)
+    labels2 = np.ascontiguousarray(labels2).reshape(-1)
+
+    # The jit function works with int64 only.
+    # (Same bit pattern, so uint64 labels survive the round-trip.)
+    body1, body2, counts = _overlap_counts(labels1.astype(np.int64, copy=False),
+                                           labels2.astype(np.int64, copy=False))
+    return body1.astype(labels1.dtype), body2.astype(labels1.dtype), counts
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def _overlap_counts(labels1, labels2):
+    """
+    Helper function for overlap_counts(), above.
+    
+    labels1, labels2:
+        Flat int64 arrays of equal length.
+    """
+    pair_counts = Dict.empty(key_type=types.UniTuple(types.int64, 2), value_type=types.int64)
+    for i in range(len(labels1)):
+        body1 = labels1[i]
+        body2 = labels2[i]
+        if body1 == 0 or body2 == 0:
+            continue
+        pair = (body1, body2)
+        if pair in pair_counts:
+            pair_counts[pair] += 1
+        else:
+            pair_counts[pair] = 1
+
+    num_pairs = len(pair_counts)
+    bodies1 = np.empty(num_pairs, np.int64)
+    bodies2 = np.empty(num_pairs, np.int64)
+    counts = np.empty(num_pairs, np.int64)
+    for i, (pair, count) in enumerate(pair_counts.items()):
+        bodies1[i] = pair[0]
+        bodies2[i] = pair[1]
+        counts[i] = count
+    return bodies1, bodies2, counts
+
@@ -72,7 +72,7 @@ def ilastik_predict_with_array(gray_vol, mask, ilp_path, selected_channels=None,
     # The process_name argument is prefixed to all log messages.
     # For now, just use the machine name and a uuid
     # FIXME: It would be nice to provide something more descriptive, like the ROI of the current spark job...
-    args.process_name = platform.node() + "-" + str(uuid.uuid1())
+    args.process_name = platform.node() + "-" + uuid.uuid4().hex
 
     # To avoid conflicts between processes, give each process it's own logfile to write to.
     if logfile != "/dev/null":
@@ -53,7 +53,7 @@ def ilastik_simple_predict(gray_vol, mask, classifier_path, filter_specs_path, s
     # The process_name argument is prefixed to all log messages.
     # For now, just use the machine name and a uuid
     # FIXME: It would be nice to provide something more descriptive, like the ROI of the current spark job...
-    process_name = platform.node() + "-" + str(uuid.uuid1())
+    process_name = platform.node() + "-" + uuid.uuid4().hex
 
     # To avoid conflicts between processes, give each process it's own logfile to write to.
     if logfile != "/dev/null":
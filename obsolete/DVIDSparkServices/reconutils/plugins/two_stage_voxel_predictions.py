@@ -155,7 +155,7 @@ def run_ilastik_stage(stage_num, ilp_path, input_vol, mask, output_path,
     # The process_name argument is prefixed to all log messages.
     # For now, just use the machine name and a uuid
     # FIXME: It would be nice to provide something more descriptive, like the ROI of the current spark job...
-    args.process_name = platform.node() + "-" + str(uuid.uuid1()) + "-" + str(stage_num)
+    args.process_name = platform.node() + "-" + uuid.uuid4().hex + "-" + str(stage_num)
 
     # To avoid conflicts between processes, give each process it's own logfile to write to.
     if logfile != "/dev/null":
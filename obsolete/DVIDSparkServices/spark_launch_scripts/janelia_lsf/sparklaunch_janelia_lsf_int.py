@@ -68,6 +68,10 @@ def main():
     driver_output = StringIO()
     
     json_header = {'content-type': 'app/json'}
+
+    # Both status updates go to the same callback server,
+    # so keep the connection open between them.
+    callback_session = requests.Session()
     start = time.time()
 
     workflow_proc = None
@@ -84,7 +88,7 @@ def main():
             status["job_status"] = "Running"
             status_str = json.dumps(status)
     
-            requests.post(args.config_or_callback_address, data=status_str, headers=json_header)
+            callback_session.post(args.config_or_callback_address, data=status_str, headers=json_header)
     
             configfile = configfile + "/config"
     
@@ -137,7 +141,7 @@ def main():
         status_str = json.dumps(status)
         
         if hascallback:
-            requests.post(args.config_or_callback_address, data=status_str, headers=json_header)
+            callback_session.post(args.config_or_callback_address, data=status_str, headers=json_header)
         
         print( "Launch script done: {}".format({True: "successful", False: "UNSUCCESSFUL"}[(workflow_proc.returncode == 0)] ) )
         if workflow_proc.returncode != 0:
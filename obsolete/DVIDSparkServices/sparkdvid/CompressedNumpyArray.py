@@ -37,7 +37,7 @@ else:
     import copyreg
 
 import numpy as np
-import lz4
+import lz4.frame
 import logging
 import warnings
 
@@ -74,9 +74,17 @@ class CompressedNumpyArray(object):
     supports arbitrarily large numpy arrays.  They are serialized
     as a list of LZ4 chunks where each chunk decompressed is 1GB.
     
-
+    Note: The (de)compression itself already runs in lz4's C code,
+    directly on the numpy buffers (no intermediate Python copies on
+    the compression side), so a custom C extension wouldn't buy much here.
+    The one remaining copy is from each decompressed slice into the result.
     """
     MAX_LZ4_BUFFER_SIZE = 1000000000
+
+    # These objects are pickled constantly (every shuffle and cache),
+    # so keep their pickled representation small: no __dict__, and see __reduce__(), below.
+    __slots__ = ('raw_buffer', 'compressed_label_blocks', 'compressed_mask_array',
+                 'serialized_subarrays', 'layout', 'dtype', 'shape')
    
     def __init__(self, numpy_array):
         """Serializes and compresses the numpy array with LZ4"""
@@ -101,9 +109,9 @@ class CompressedNumpyArray(object):
         if self.is_labels(numpy_array):
             self.compressed_label_blocks = serialize_uint64_blocks(numpy_array)
         elif self.dtype == np.bool and numpy_array.ndim == 3:
-            # It turns out that encode_mask_array + lz4.compress is better than
-            # lz4.compression alone (even multiple rounds of lz4 alone)
-            self.compressed_mask_array = lz4.compress(encode_mask_array(numpy_array))
+            # It turns out that encode_mask_array + lz4.frame.compress is better than
+            # lz4.frame.compress alone (even multiple rounds of lz4 alone)
+            self.compressed_mask_array = lz4.frame.compress(encode_mask_array(numpy_array))
         else:
 
             if numpy_array.ndim <= 1:
@@ -125,12 +133,19 @@ class CompressedNumpyArray(object):
                     for subarray in numpy_array:
                         self.serialized_subarrays.append( self.serialize_subarray(subarray) )
 
+    def __reduce__(self):
+        """
+        Pickle as a flat tuple of members, rather than a dict of member names and values.
+        """
+        state = tuple(getattr(self, k) for k in CompressedNumpyArray.__slots__)
+        return (_reconstruct_compressed_numpy_array, state)
+
     @property
     def compressed_nbytes(self):
         if self.raw_buffer is not None:
             return len(self.raw_buffer)
         if self.compressed_label_blocks is not None:
-            return len(self.compressed_label_blocks)
+            return sum(map(len, self.compressed_label_blocks))
         if self.compressed_mask_array is not None:
             return len(self.compressed_mask_array)
 
@@ -149,7 +164,7 @@ class CompressedNumpyArray(object):
         assert subarray.nbytes <= cls.MAX_LZ4_BUFFER_SIZE, \
             "FIXME: This class doesn't support compression of arrays whose slices are each > 1 GB"
         
-        return lz4.compress( subarray )
+        return lz4.frame.compress( subarray )
 
     def deserialize(self):
         """Extract the numpy array"""
@@ -160,18 +175,18 @@ class CompressedNumpyArray(object):
             # label compression was used.
             numpy_array = deserialize_uint64_blocks(self.compressed_label_blocks, self.shape)
         elif self.compressed_mask_array is not None:
-            numpy_array, _, _ = decode_mask_array(lz4.uncompress(self.compressed_mask_array), self.shape)
+            numpy_array, _, _ = decode_mask_array(lz4.frame.decompress(self.compressed_mask_array), self.shape)
             numpy_array = np.asarray(numpy_array, order='C')
         else:
-            numpy_array = np.ndarray( shape=self.shape, dtype=self.dtype )
-            
             # See serialization of 2D, 1D and 0D arrays, above.
-            if numpy_array.ndim <= 2:
-                buf = lz4.uncompress(self.serialized_subarrays[0])
-                numpy_array[:] = np.frombuffer(buf, self.dtype).reshape( numpy_array.shape )
+            if len(self.shape) <= 2:
+                # Decompress into a (writable) bytearray and use it directly, without an extra copy.
+                buf = lz4.frame.decompress(self.serialized_subarrays[0], return_bytearray=True)
+                numpy_array = np.frombuffer(buf, self.dtype).reshape( self.shape )
             else:
+                numpy_array = np.ndarray( shape=self.shape, dtype=self.dtype )
                 for subarray, serialized_subarray in zip(numpy_array, self.serialized_subarrays):
-                    buf = lz4.uncompress(serialized_subarray)
+                    buf = lz4.frame.decompress(serialized_subarray)
                     subarray[:] = np.frombuffer(buf, self.dtype).reshape( subarray.shape )
 
         if self.layout == 'F':
@@ -183,6 +198,15 @@ class CompressedNumpyArray(object):
     def is_labels(cls, volume):
         return volume.dtype == np.uint64 and volume.ndim == 3
 
+def _reconstruct_compressed_numpy_array(*state):
+    """
+    Used to unpickle a CompressedNumpyArray (see CompressedNumpyArray.__reduce__).
+    """
+    compressed_array = CompressedNumpyArray.__new__(CompressedNumpyArray)
+    for k, v in zip(CompressedNumpyArray.__slots__, state):
+        setattr(compressed_array, k, v)
+    return compressed_array
+
 def serialize_uint64_blocks(volume):
     """
     Compress and serialize a volume of uint64.
@@ -216,7 +240,7 @@ def serialize_uint64_blocks(volume):
 
         # We compress AGAIN, with LZ4, because this seems to provide
         # an additional 2x size reduction for nearly no slowdown.
-        compressed_block = lz4.compress( encoded_block )
+        compressed_block = lz4.frame.compress( encoded_block )
         compressed_blocks.append( compressed_block )
         del block
     
@@ -242,7 +266,7 @@ def deserialize_uint64_blocks(compressed_blocks, shape):
         compressed_block = compressed_blocks[bi]
         
         # (See note above regarding recompression with LZ4)
-        encoded_block = lz4.decompress( compressed_block )
+        encoded_block = lz4.frame.decompress( compressed_block )
         block = decode_label_block( encoded_block )
         block_view[zi,yi,xi] = block
     
@@ -24,6 +24,10 @@ class Subvolume(object):
     helping to determine overlap between substacks.
     
     """
+    # Subvolumes are sent along with nearly every RDD item,
+    # so avoid the per-instance __dict__ in their pickled representation.
+    __slots__ = ('sv_index', 'box', 'border', 'local_regions', 'roi_blocksize',
+                 'intersecting_blocks', 'intersecting_blocks_noborder', 'is_interior')
 
     def __init__(self, sv_index, box_start_zyx, chunk_size, border, roi_map):
         """Initializes subvolume.
@@ -37,9 +41,11 @@ class Subvolume(object):
         """
         self.sv_index = sv_index
         
-        box_stop_zyx = np.array(box_start_zyx) + chunk_size
-        box = np.array( (box_start_zyx, box_stop_zyx) )
-        self.box = SubvolumeNamedTuple(*box.flat)
+        # Store plain Python ints (not numpy scalars), which are
+        # cheaper to construct, compare, and pickle.
+        box_start_zyx = [int(p) for p in box_start_zyx]
+        box_stop_zyx = [p + int(chunk_size) for p in box_start_zyx]
+        self.box = SubvolumeNamedTuple(*box_start_zyx, *box_stop_zyx)
         self.border = border
         self.local_regions = []
 
@@ -65,8 +71,13 @@ class Subvolume(object):
         subvol_start_px = np.array(self.box_with_border[0:3])
         subvol_stop_px  = np.array(self.box_with_border[3:6])
 
-        # How many blocks fit in this subvolume (regardless of ROI)?
-        full_subvol_size_blocks = np.prod( (subvol_stop_px - subvol_start_px) // self.roi_blocksize )
+        # How many blocks does this subvolume touch (regardless of ROI)?
+        # (Must use the same block range as roi_coords_for_box(), below.
+        #  A subvolume with a border, or one that isn't block-aligned,
+        #  touches partial blocks on its edges.)
+        subvol_blocks_start = subvol_start_px // self.roi_blocksize
+        subvol_blocks_stop = (subvol_stop_px + self.roi_blocksize-1) // self.roi_blocksize
+        full_subvol_size_blocks = np.prod( subvol_blocks_stop - subvol_blocks_start )
 
         subvol_block_coords = self.roi_coords_for_box(roi_map, subvol_start_px, subvol_stop_px)
 
@@ -76,10 +87,14 @@ class Subvolume(object):
         # We're "interior" if all blocks are present in the ROI
         self.is_interior = ( len(subvol_block_coords) == full_subvol_size_blocks )
 
-        # Find intersecting blocks without border
-        self.intersecting_blocks_noborder = self.roi_coords_for_box( roi_map,
-                                                                     np.array(self.box[0:3]),
-                                                                     np.array(self.box[3:6]) )
+        # Find intersecting blocks without border.
+        # Those are a subset of the blocks we just found, so just filter them
+        # rather than consulting the roi_map a second time.
+        noborder_blocks_start = np.array(self.box[0:3]) // self.roi_blocksize
+        noborder_blocks_stop = (np.array(self.box[3:6]) + self.roi_blocksize-1) // self.roi_blocksize
+        in_noborder = ( (subvol_block_coords >= noborder_blocks_start)
+                        & (subvol_block_coords < noborder_blocks_stop) ).all(axis=1)
+        self.intersecting_blocks_noborder = subvol_block_coords[in_noborder]
         
     def roi_coords_for_box(self, roi_map, subvol_start_px, subvol_stop_px):
         from DVIDSparkServices.util import bb_to_slicing, RoiMap
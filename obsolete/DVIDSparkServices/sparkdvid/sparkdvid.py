@@ -20,6 +20,13 @@ is backed by a clustered DB.
 """
 from __future__ import division
 
+import os
+import itertools
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+import ujson
 import requests
 import numpy as np
 from DVIDSparkServices.sparkdvid.Subvolume import Subvolume
@@ -32,13 +39,36 @@ from neuclease.dvid import parse_rle_response
 from neuclease.util import extract_subvol
 
 from DVIDSparkServices.auto_retry import auto_retry
-from DVIDSparkServices.util import mask_roi, RoiMap, num_worker_nodes, cpus_per_worker, default_dvid_session
+from DVIDSparkServices.util import bb_to_slicing, mask_roi, RoiMap, num_worker_nodes, cpus_per_worker, default_dvid_session, runlength_decode_from_ranges
 from DVIDSparkServices.io_util.partitionSchema import volumePartition
 from DVIDSparkServices.io_util.brick import generate_bricks_from_volume_source
 from DVIDSparkServices.dvid.metadata import create_label_instance, DataInstance, get_blocksize
 
-@auto_retry(2, 10.0, __name__)
+# Node services are cached per-thread (DVIDNodeService instances can't be
+# shared across threads), so they're discarded along with their thread.
+_node_service_cache = threading.local()
+
 def retrieve_node_service(server, uuid, resource_server, resource_port, appname="sparkservices"):
+    """
+    Return a DVID node service object.
+    
+    Constructing a DVIDNodeService is relatively expensive, so each
+    worker thread reuses the one it created for the same arguments.
+    """
+    key = (str(server), str(uuid), str(resource_server), resource_port, appname, os.getpid())
+    try:
+        services = _node_service_cache.services
+    except AttributeError:
+        services = _node_service_cache.services = {}
+
+    try:
+        return services[key]
+    except KeyError:
+        node_service = services[key] = _create_node_service(server, uuid, resource_server, resource_port, appname)
+        return node_service
+
+@auto_retry(2, 10.0, __name__)
+def _create_node_service(server, uuid, resource_server, resource_port, appname):
     """Create a DVID node service object"""
 
     server = str(server)  
@@ -61,7 +91,6 @@ def retrieve_node_service(server, uuid, resource_server, resource_port, appname=
     """
 
     from libdvid import DVIDNodeService
-    import os
     username = os.environ["USER"]
 
     if resource_server != "":
@@ -72,6 +101,73 @@ def retrieve_node_service(server, uuid, resource_server, resource_port, appname=
 
     return node_service
 
+# A long-lived (per-process) pool for fetching the second volume in
+# map_labels64_pair() while the task thread fetches the first.
+# Its threads persist across tasks, so their cached node services are reused.
+_pair_fetch_executor = None
+_pair_fetch_executor_lock = threading.Lock()
+
+def _get_pair_fetch_executor():
+    global _pair_fetch_executor
+    with _pair_fetch_executor_lock:
+        if _pair_fetch_executor is None:
+            _pair_fetch_executor = ThreadPoolExecutor(4)
+        return _pair_fetch_executor
+
+def zorder_codes(coords_zyx):
+    """
+    Compute the Z-order (Morton) code for each of the given
+    non-negative integer coordinates, provided as an array of shape (N,3).
+    Sorting by these codes places nearby coordinates near each other.
+    """
+    coords_zyx = np.asarray(coords_zyx, dtype=np.uint64)
+    codes = np.zeros(len(coords_zyx), dtype=np.uint64)
+    for bit in range(21):
+        for axis in range(3):
+            axis_bit = (coords_zyx[:, axis] >> np.uint64(bit)) & np.uint64(1)
+            codes |= axis_bit << np.uint64(3*bit + (2-axis))
+    return codes
+
+
+def map_values_prefetched(rdd, f, prefetch_depth=2):
+    """
+    Like rdd.mapValues(f), but within each partition, up to prefetch_depth
+    calls to f are kept in flight on a thread pool.
+
+    Intended for I/O-bound mappers (e.g. DVID fetches), so that a worker
+    overlaps the network latency of consecutive requests instead of waiting
+    on each one in turn.  Results are yielded in the original order, and the
+    partitioner is preserved.
+
+    Note: Each in-flight call may hold a full result (e.g. a subvolume) in RAM,
+          so keep prefetch_depth small.  Partitions with only one item
+          (the parallelize_roi() default) are mapped directly, with no threads.
+    """
+    def map_partition(kv_pairs):
+        kv_pairs = iter(kv_pairs)
+        first_pairs = list(itertools.islice(kv_pairs, 2))
+        kv_pairs = itertools.chain(first_pairs, kv_pairs)
+
+        if len(first_pairs) < 2 or prefetch_depth < 1:
+            for k, v in kv_pairs:
+                yield (k, f(v))
+            return
+
+        pending = collections.deque()
+        with ThreadPoolExecutor(prefetch_depth) as executor:
+            for k, v in itertools.islice(kv_pairs, prefetch_depth):
+                pending.append( (k, executor.submit(f, v)) )
+
+            while pending:
+                k, future = pending.popleft()
+                result = future.result()
+                for k_next, v_next in itertools.islice(kv_pairs, 1):
+                    pending.append( (k_next, executor.submit(f, v_next)) )
+                yield (k, result)
+
+    return rdd.mapPartitions(map_partition, preservesPartitioning=True)
+
+
 class sparkdvid(object):
     """Creates a spark dvid context that holds the spark context.
 
@@ -101,21 +197,21 @@ class sparkdvid(object):
     # Produce RDDs for each subvolume partition (this will replace default implementation)
     # Treats subvolum index as the RDD key and maximizes partition count for now
     # Assumes disjoint subsvolumes in ROI
-    def parallelize_roi(self, roi, chunk_size, border=0, find_neighbors=False, partition_method='ask-dvid', partition_filter=None):
+    def parallelize_roi(self, roi, chunk_size, border=0, find_neighbors=False, partition_method='ask-dvid', partition_filter=None, num_partitions=None):
         """Creates an RDD from subvolumes found in an ROI.
 
         This is analogous to the Spark parallelize function.
-        It currently defines the number of partitions as the 
+        By default, it defines the number of partitions as the 
         number of subvolumes.
 
-        TODO: implement general partitioner given other
-        input such as bounding box coordinates.
-        
         Args:
             roi (str): name of DVID ROI at current server and uuid
             chunk_size (int): the desired dimension of the subvolume
             border (int): size of the border surrounding the subvolume
             find_neighbors (bool): whether to identify neighbors
+            num_partitions (int): If provided, group the subvolumes into this many
+                partitions, such that each partition holds a spatially compact
+                group of subvolumes (via Z-order).
 
         Returns:
             RDD as [(subvolume id, subvolume)] and # of subvolumes
@@ -124,8 +220,15 @@ class sparkdvid(object):
         subvolumes = self._initialize_subvolumes(roi, chunk_size, border, find_neighbors, partition_method, partition_filter)
         enumerated_subvolumes = [(sv.sv_index, sv) for sv in subvolumes]
 
-        # Potential TODO: custom partitioner for grouping close regions
-        return self.sc.parallelize(enumerated_subvolumes, len(enumerated_subvolumes))
+        if num_partitions is None or len(enumerated_subvolumes) == 0:
+            return self.sc.parallelize(enumerated_subvolumes, len(enumerated_subvolumes))
+
+        # parallelize() slices its input into contiguous runs,
+        # so sorting in Z-order keeps each partition spatially compact.
+        cells = np.array([(sv.box.z1, sv.box.y1, sv.box.x1) for sv in subvolumes]) // chunk_size
+        order = np.argsort(zorder_codes(cells - cells.min(axis=0)), kind='stable')
+        enumerated_subvolumes = [enumerated_subvolumes[i] for i in order]
+        return self.sc.parallelize(enumerated_subvolumes, min(num_partitions, len(enumerated_subvolumes)))
 
     def _initialize_subvolumes(self, roi, chunk_size, border=0, find_neighbors=False, partition_method='ask-dvid', partition_filter=None):
         if partition_method == 'grid-aligned':
@@ -141,28 +244,44 @@ class sparkdvid(object):
         # Create dense representation of ROI
         roi_map = RoiMap( self.get_roi(roi) )
 
-        # Initialize all Subvolumes (sv_index is updated below)
-        subvolumes = [Subvolume(None, (ss.z, ss.y, ss.x), chunk_size, border, roi_map) for ss in substack_tuples]
+        # Initialize, filter, and index all Subvolumes in a single pass
+        subvolumes = []
+        for ss in substack_tuples:
+            sv = Subvolume(None, (ss.z, ss.y, ss.x), chunk_size, border, roi_map)
 
-        # Discard empty subvolumes (ones that don't intersect the ROI at all).
-        # The 'grid-aligned' partition-method can return such subvolumes;
-        # it assumes we'll filter them out, which we're doing right now.
-        subvolumes = [sv for sv in subvolumes if len(sv.intersecting_blocks_noborder) != 0]
+            # Discard empty subvolumes (ones that don't intersect the ROI at all).
+            # The 'grid-aligned' partition-method can return such subvolumes;
+            # it assumes we'll filter them out, which we're doing right now.
+            if len(sv.intersecting_blocks_noborder) == 0:
+                continue
 
-        # Discard 'interior' subvolumes if the user doesn't want them.
-        if partition_filter == 'interior-only':
-            subvolumes = [sv for sv in subvolumes if sv.is_interior]
+            # Discard non-'interior' subvolumes if the user wants interior-only.
+            if partition_filter == 'interior-only' and not sv.is_interior:
+                continue
 
-        # Assign sv_index
-        for i, sv in enumerate(subvolumes):
-            sv.sv_index = i
+            sv.sv_index = len(subvolumes)
+            subvolumes.append(sv)
 
         # grab all neighbors for each substack
         if find_neighbors:
-            # inefficient search for all boundaries
-            for i in range(0, len(subvolumes)-1):
-                for j in range(i+1, len(subvolumes)):
-                    subvolumes[i].recordborder(subvolumes[j])
+            # Bin the subvolumes by their chunk-grid cell.
+            # All subvolumes are chunk_size wide, so any two that touch
+            # must lie in the same cell or in one of its 26 neighbors.
+            # (That holds even if the partitions aren't grid-aligned.)
+            cells = [(sv.box.z1 // chunk_size, sv.box.y1 // chunk_size, sv.box.x1 // chunk_size) for sv in subvolumes]
+            grid = collections.defaultdict(list)
+            for i, cell in enumerate(cells):
+                grid[cell].append(i)
+
+            neighbor_offsets = list(itertools.product((-1, 0, 1), repeat=3))
+            for i, (sv, (cz, cy, cx)) in enumerate(zip(subvolumes, cells)):
+                candidates = []
+                for (dz, dy, dx) in neighbor_offsets:
+                    candidates.extend( j for j in grid.get((cz+dz, cy+dy, cx+dx), ()) if j > i )
+
+                # Visit candidates in the same order as an exhaustive pairwise search would.
+                for j in sorted(candidates):
+                    sv.recordborder(subvolumes[j])
 
         return subvolumes
 
@@ -175,19 +294,18 @@ class sparkdvid(object):
         session = default_dvid_session()
 
         # grab roi blocks (should use libdvid but there are problems handling 206 status)
-        import requests
+        # (The session keeps its connection alive and retries 503 errors.)
         addr = self.dvid_server + "/api/node/" + str(self.uuid) + "/" + str(roi) + "/roi"
         if not self.dvid_server.startswith("http://"):
             addr = "http://" + addr
         data = session.get(addr)
-        roi_blockruns = data.json()
-        
-        roi_blocks = []
-        for (z,y,x_first, x_last) in roi_blockruns:
-            for x in range(x_first, x_last+1):
-                roi_blocks.append((z,y,x))
-        
-        return roi_blocks
+        data.raise_for_status()
+
+        # ujson parses large lists of ints considerably faster than requests' json()
+        roi_blockruns = np.array(ujson.loads(data.content), dtype=np.int64).reshape((-1,4))
+
+        # Returns array of shape (N,3), one (z,y,x) block coordinate per row
+        return runlength_decode_from_ranges(roi_blockruns)
 
     def get_roi_partition(self, roi_name, subvol_size, partition_method):
         """
@@ -222,7 +340,7 @@ class sparkdvid(object):
             assert subvol_size % grid_spacing_px == 0, \
                 "Subvolume partitions won't be aligned to grid unless subvol_size is a multiple of the grid size."
             
-            roi_blocks = np.asarray(list(self.get_roi(roi_name)))
+            roi_blocks = self.get_roi(roi_name)
             roi_blocks_start = np.min(roi_blocks, axis=0)
             roi_blocks_stop = 1 + np.max(roi_blocks, axis=0)
             
@@ -282,30 +400,31 @@ class sparkdvid(object):
 
         """
         import os
-        from pyspark import StorageLevel
-        from pyspark.storagelevel import StorageLevel
 
         if not enable_rollback or not os.path.exists(checkpoint_loc): 
             if os.path.exists(checkpoint_loc):
                 import shutil
                 shutil.rmtree(checkpoint_loc)
-            rdd.persist(StorageLevel.MEMORY_AND_DISK_SER)
+
+            # Rather than caching the RDD in addition to writing it out,
+            # compute it once, save it, and read it back from the checkpoint.
+            # (Same as the rollback case below.)
             rdd.saveAsPickleFile(checkpoint_loc)
-            return rdd
-        else:
-            newrdd = self.sc.pickleFile(checkpoint_loc)
-            return newrdd
 
+        return self.sc.pickleFile(checkpoint_loc)
 
-    def map_grayscale8(self, distsubvolumes, gray_name):
+
+    def map_grayscale8(self, distsubvolumes, gray_name, compress=False):
         """Creates RDD of grayscale data from subvolumes.
 
         Note: Since EM grayscale is not highly compressible
-        lz4 is not called.
+        lz4 is not used by default.
 
         Args:
             distsubvolumes (RDD): (subvolume id, subvolume)
             gray_name (str): name of grayscale instance
+            compress (bool): request lz4-compressed transfers from DVID,
+                which can help if the network (not DVID's CPU) is the bottleneck.
 
         Returns:
             RDD of grayscale data (partitioner perserved)
@@ -339,17 +458,19 @@ class sparkdvid(object):
                 if resource_server != "":
                     return node_service.get_gray3D( str(gray_name),
                                                     (size_z, size_y, size_x),
-                                                    (subvolume.box.z1-subvolume.border, subvolume.box.y1-subvolume.border, subvolume.box.x1-subvolume.border), throttle=False )
+                                                    (subvolume.box.z1-subvolume.border, subvolume.box.y1-subvolume.border, subvolume.box.x1-subvolume.border),
+                                                    throttle=False, compress=compress )
                 else:
                     return node_service.get_gray3D( str(gray_name),
                                                     (size_z, size_y, size_x),
-                                                    (subvolume.box.z1-subvolume.border, subvolume.box.y1-subvolume.border, subvolume.box.x1-subvolume.border) )
+                                                    (subvolume.box.z1-subvolume.border, subvolume.box.y1-subvolume.border, subvolume.box.x1-subvolume.border),
+                                                    compress=compress )
 
             gray_volume = get_gray()
 
             return (subvolume, gray_volume)
 
-        return distsubvolumes.mapValues(mapper)
+        return map_values_prefetched(distsubvolumes, mapper)
 
     def map_labels64(self, distrois, label_name, border, roiname=""):
         """Creates RDD of labelblk data from subvolumes.
@@ -404,7 +525,7 @@ class sparkdvid(object):
 
                 return data
             return get_labels()
-        return distrois.mapValues(mapper)
+        return map_values_prefetched(distrois, mapper)
 
     def map_voxels(self, partitions, instance_name, scale=0, num_rdd_partitions=None):
         """
@@ -694,10 +815,19 @@ class sparkdvid(object):
                 islabelarray2 = True
 
         def mapper(subvolume):
-            # get sizes of box
-            size_x = subvolume.box.x2 - subvolume.box.x1
-            size_y = subvolume.box.y2 - subvolume.box.y1
-            size_z = subvolume.box.z2 - subvolume.box.z1
+            # Both volumes are fetched from the same block-aligned box
+            # (computed once here), and then cropped to the subvolume.
+            box_start = np.array(subvolume.box[0:3])
+            box_stop = np.array(subvolume.box[3:6])
+            fetch_start = box_start - (box_start % blocksize)
+            fetch_stop = ((box_stop + blocksize - 1) // blocksize) * blocksize
+            fetch_shape = tuple((fetch_stop - fetch_start).tolist())
+            fetch_offset = tuple(fetch_start.tolist())
+            crop = bb_to_slicing(box_start - fetch_start, box_stop - fetch_start)
+
+            get3d_kwargs = { 'throttle': (resource_server == "") }
+            if level > 0:
+                get3d_kwargs['scale'] = level
 
             @auto_retry(3, pause_between_tries=60.0, logging_name=__name__)
             def get_labels():
@@ -710,66 +840,17 @@ class sparkdvid(object):
                 if islabelarray:
                     get3d = node_service.get_labelarray_blocks3D
 
-
-                z1 = subvolume.box.z1
-                y1 = subvolume.box.y1
-                x1 = subvolume.box.x1
-                sz = size_z
-                sy = size_y
-                sx = size_x
-
-                sz = sz + (z1 % blocksize)
-                sy = sy + (y1 % blocksize)
-                sx = sx + (x1 % blocksize)
-                z1 = z1 - (z1 % blocksize)
-                y1 = y1 - (y1 % blocksize)
-                x1 = x1 - (x1 % blocksize)
-
-                if (sz % blocksize) > 0:
-                    sz = sz + blocksize - (sz%blocksize)
-                if (sy % blocksize) > 0:
-                    sy = sy + blocksize - (sy%blocksize)
-                if (sx % blocksize) > 0:
-                    sx = sx + blocksize - (sx%blocksize)
-
-                if level > 0:
-                    if resource_server != "":
-                        data = get3d( str(label_name),
-                                      (sz, sy, sx),
-                                      (z1, y1, x1), throttle=False, scale=level)
-                    else:
-                        data = get3d( str(label_name),
-                                      (sz, sy, sx),
-                                      (z1, y1, x1), throttle=True, scale=level)
-
-                    data = data[(subvolume.box.z1-z1):(subvolume.box.z1-z1+size_z),(subvolume.box.y1-y1):(subvolume.box.y1-y1+size_y),(subvolume.box.x1-x1):(subvolume.box.x1-x1+size_x)]
-
-                else:
-                    if resource_server != "":
-                        data = get3d( str(label_name),
-                                      (sz, sy, sx),
-                                      (z1, y1, x1), throttle=False)
-                    else:
-                        data = get3d( str(label_name),
-                                      (sz, sy, sx),
-                                      (z1, y1, x1), throttle=True)
-                    data = data[(subvolume.box.z1-z1):(subvolume.box.z1-z1+size_z),(subvolume.box.y1-y1):(subvolume.box.y1-y1+size_y),(subvolume.box.x1-x1):(subvolume.box.x1-x1+size_x)]
+                data = get3d( str(label_name), fetch_shape, fetch_offset, **get3d_kwargs )
+                data = data[crop]
 
                 # mask ROI
                 if roiname != "":
                     mask_roi(data, subvolume) 
 
                 return data
-            label_volume = get_labels()
 
             @auto_retry(3, pause_between_tries=60.0, logging_name=__name__)
             def get_labels2():
-                # fetch dummy value if no server2
-                if server2 == "":
-                    label_volume2 = label_volume.copy()
-                    label_volume2[:,:,:] = 1
-                    return label_volume2
-
                 # fetch second label volume
                 # retrieve data from box start position
                 # Note: libdvid uses zyx order for python functions
@@ -778,61 +859,31 @@ class sparkdvid(object):
                 get3d = node_service2.get_labels3D
                 if islabelarray2:
                     get3d = node_service2.get_labelarray_blocks3D
-                
-                z1 = subvolume.box.z1
-                y1 = subvolume.box.y1
-                x1 = subvolume.box.x1
-                sz = size_z
-                sy = size_y
-                sx = size_x
-
-                sz = sz + (z1 % blocksize)
-                sy = sy + (y1 % blocksize)
-                sx = sx + (x1 % blocksize)
-                z1 = z1 - (z1 % blocksize)
-                y1 = y1 - (y1 % blocksize)
-                x1 = x1 - (x1 % blocksize)
-
-                if (sz % blocksize) > 0:
-                    sz = sz + blocksize - (sz%blocksize)
-                if (sy % blocksize) > 0:
-                    sy = sy + blocksize - (sy%blocksize)
-                if (sx % blocksize) > 0:
-                    sx = sx + blocksize - (sx%blocksize)
-
-                if level > 0:
-                    if resource_server != "":
-                        data = get3d( str(label_name2),
-                                      (sz, sy, sx),
-                                      (z1, y1, x1), throttle=False, scale=level)
-                    else:
-                        data = get3d( str(label_name2),
-                                      (sz, sy, sx),
-                                      (z1, y1, x1), throttle=True, scale=level)
-                    data = data[(subvolume.box.z1-z1):(subvolume.box.z1-z1+size_z),(subvolume.box.y1-y1):(subvolume.box.y1-y1+size_y),(subvolume.box.x1-x1):(subvolume.box.x1-x1+size_x)]
-                else:
-                    if resource_server != "":
-                        data = get3d( str(label_name2),
-                                      (sz, sy, sx),
-                                      (z1, y1, x1), throttle=False)
-                    else:
-                        data = get3d( str(label_name2),
-                                      (sz, sy, sx),
-                                      (z1, y1, x1), throttle=True)
-                    data = data[(subvolume.box.z1-z1):(subvolume.box.z1-z1+size_z),(subvolume.box.y1-y1):(subvolume.box.y1-y1+size_y),(subvolume.box.x1-x1):(subvolume.box.x1-x1+size_x)]
+
+                data = get3d( str(label_name2), fetch_shape, fetch_offset, **get3d_kwargs )
+                data = data[crop]
 
                 if roiname != "":
                     mask_roi(data, subvolume)        
                 return data
 
-            label_volume2 = get_labels2()
+            if server2 == "":
+                # use dummy value if no server2
+                label_volume = get_labels()
+                label_volume2 = np.ones_like(label_volume)
+            else:
+                # The two volumes come from independent sources, so fetch them concurrently:
+                # the second in the background, the first on this thread.
+                label_future2 = _get_pair_fetch_executor().submit(get_labels2)
+                label_volume = get_labels()
+                label_volume2 = label_future2.result()
 
             # zero out label_volume2 where GT is 0'd out !!
-            label_volume2[label_volume==0] = 0
+            np.putmask(label_volume2, label_volume==0, 0)
 
             return (subvolume, label_volume, label_volume2)
 
-        return distrois.mapValues(mapper)
+        return map_values_prefetched(distrois, mapper)
 
 
     # foreach will write graph elements to DVID storage
@@ -868,16 +919,22 @@ class sparkdvid(object):
             if element_pairs is None:
                 return
 
-            vertices = []
-            edges = []
-            for element_pair in element_pairs:
-                edge, weight = element_pair
-                v1, v2 = edge
+            element_pairs = list(element_pairs)
 
-                if v2 == -1:
-                    vertices.append(Vertex(v1, weight))
-                else:
-                    edges.append(Edge(v1, v2, weight))
+            # Don't bother contacting DVID for empty partitions
+            if not element_pairs:
+                return []
+
+            node_pairs = np.array([edge for (edge, _weight) in element_pairs], dtype=np.int64).reshape(-1, 2)
+            weights = np.array([weight for (_edge, weight) in element_pairs], dtype=np.float64)
+            is_vertex = (node_pairs[:, 1] == -1)
+
+            # libdvid only accepts lists of Vertex/Edge objects,
+            # but we can at least construct them without a per-element Python branch.
+            vertices = list(map(Vertex, node_pairs[is_vertex, 0].tolist(), weights[is_vertex].tolist()))
+            edges = list(map(Edge, node_pairs[~is_vertex, 0].tolist(),
+                                   node_pairs[~is_vertex, 1].tolist(),
+                                   weights[~is_vertex].tolist()))
     
             node_service = retrieve_node_service(server, uuid, resource_server, resource_port)
             if len(vertices) > 0:
@@ -977,8 +1034,8 @@ class sparkdvid(object):
             # extract seg ignoring borders (z,y,x)
             seg = seg[border:size3+border, border:size2+border, border:size1+border]
 
-            # copy the slice to make contiguous before sending 
-            seg = numpy.copy(seg, order='C')
+            # make contiguous before sending (no copy if the border was empty)
+            seg = numpy.ascontiguousarray(seg)
 
             @auto_retry(3, pause_between_tries=600.0, logging_name= __name__)
             def put_labels():
@@ -1,5 +1,6 @@
 import os
 import sys
+import copy
 import time
 import signal
 import pickle
@@ -331,6 +332,14 @@ class _ForkedProcessLogHandler(logging.Handler):
         self._connection = connection_to_parent
         
     def emit(self, record):
+        # Like logging.handlers.QueueHandler.prepare():
+        # Merge the args (and traceback, if any) into the message before sending,
+        # so we don't pickle arbitrary (possibly large, or unpicklable) args objects.
+        record = copy.copy(record)
+        record.msg = self.format(record)
+        record.args = None
+        record.exc_info = None
+        record.exc_text = None
         self._connection.send(record)
 
 
@@ -16,6 +16,8 @@ import getpass
 import threading
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import psutil
 import numpy as np
 from skimage.util import view_as_blocks
@@ -55,6 +57,16 @@ def default_dvid_session(appname=None):
         s = requests.Session()
         s.params = { 'u': getpass.getuser(),
                      'app': appname }
+
+        # Retry connection failures and DVID's occasional 503 errors, with backoff.
+        # Note: This applies to every user of the default session.
+        #       With raise_on_status=False, once the retries are exhausted the caller
+        #       still receives the final 503 response (and can raise_for_status()),
+        #       rather than a RetryError with no response attached.
+        retry = Retry(total=3, backoff_factor=1.0, status_forcelist=(503,), raise_on_status=False)
+        adapter = HTTPAdapter(max_retries=retry)
+        s.mount('http://', adapter)
+        s.mount('https://', adapter)
         DEFAULT_DVID_SESSIONS[(appname, thread_id, pid)] = s
 
     return s
@@ -117,6 +129,20 @@ def get_localhost_ip_address():
     return ip_addr
     
 
+_HOSTNAME = None
+def local_hostname():
+    """
+    Return socket.gethostname(), resolved only once per process.
+    
+    Call this from within a task (rather than storing the result
+    in a closure) so that each worker reports its own hostname.
+    """
+    global _HOSTNAME
+    if _HOSTNAME is None:
+        _HOSTNAME = socket.gethostname()
+    return _HOSTNAME
+
+
 @contextlib.contextmanager
 def Timer(msg=None, logger=None):
     if msg:
@@ -184,10 +210,9 @@ def unicode_to_str(json_data):
     elif isinstance(json_data, list):
         return map(unicode_to_str, json_data)
     elif isinstance(json_data, dict):
-        json_data = copy.deepcopy(json_data)
-        for k,v in json_data.items():
-            json_data[k] = unicode_to_str(v)
-        return json_data
+        # Build a new dict (rather than deep-copying each level and then
+        # overwriting it), so each node is visited only once.
+        return { k: unicode_to_str(v) for k,v in json_data.items() }
     else:
         return json_data
 
@@ -393,7 +418,8 @@ def coordlist_to_boolmap(coordlist, bounding_box=None):
     
     Returns: boolmap (3D array, bool), and the bounding_box (start, stop) of the array.
     """
-    coordlist = np.asarray(list(coordlist)) # Convert, in case coordlist was a set
+    if not isinstance(coordlist, np.ndarray):
+        coordlist = np.asarray(list(coordlist)) # Convert, in case coordlist was a set
     coordlist_min = np.min(coordlist, axis=0)
     coordlist_max = np.max(coordlist, axis=0)
     
@@ -403,8 +429,8 @@ def coordlist_to_boolmap(coordlist, bounding_box=None):
         start, stop = bounding_box
         if (coordlist_min < start).any() or (coordlist_max >= stop).any():
             # Remove the coords that are outside the user's bounding-box of interest
-            coordlist = [coord for coord in coordlist if (coord - start >= 0).all() and (coord < stop).all()]
-            coordlist = np.array(coordlist)
+            keep = ((coordlist >= start) & (coordlist < stop)).all(axis=1)
+            coordlist = coordlist[keep]
 
     shape = stop - start
     coords = coordlist - start
@@ -635,12 +661,60 @@ def mask_roi(data, subvolume, border='default'):
     
     Note: This function operates on data IN-PLACE
     """
-    mask = dense_roi_mask_for_subvolume(subvolume, border)
-    assert data.shape == mask.shape
-    data[np.logical_not(mask)] = 0
+    if subvolume.is_interior:
+        # The ROI covers the entire subvolume (including the border),
+        # so there's nothing to mask.
+        return None
+
+    sv = subvolume
+    if border == 'default':
+        border = sv.border
+    else:
+        assert border <= sv.border, \
+            "Subvolumes don't store ROI blocks outside of their known border "\
+            "region, so I can't produce a mask outside that area."
+
+    sv_start_px = np.array((sv.box.z1, sv.box.y1, sv.box.x1)) - border
+    sv_stop_px  = np.array((sv.box.z2, sv.box.y2, sv.box.x2)) + border
+    assert data.shape == tuple(sv_stop_px - sv_start_px)
+
+    # Rather than upscaling the block mask to a full pixel-level mask (as
+    # dense_roi_mask_for_subvolume() does), consult the block mask directly
+    # while zeroing the data, in a single pass.
+    sv_start_blocks = sv_start_px // sv.roi_blocksize
+    sv_stop_blocks = (sv_stop_px + sv.roi_blocksize-1) // sv.roi_blocksize
+    block_mask, _ = coordlist_to_boolmap(sv.intersecting_blocks, (sv_start_blocks, sv_stop_blocks))
+
+    block_offset_px = sv_start_px % sv.roi_blocksize
+    _mask_outside_blocks(data, block_mask, block_offset_px, sv.roi_blocksize)
     return None # Emphasize in-place behavior
 
 
+@jit(nopython=True)
+def _mask_outside_blocks(data, block_mask, block_offset_px, block_width):
+    """
+    Helper function for mask_roi(), above.
+    
+    Zero every voxel of the 3D array 'data' that falls in a block
+    which is False in 'block_mask'.
+    
+    block_offset_px: The position of data[0,0,0] within the first block of block_mask.
+    """
+    oz, oy, ox = block_offset_px
+    for z in range(data.shape[0]):
+        bz = (z + oz) // block_width
+        for y in range(data.shape[1]):
+            by = (y + oy) // block_width
+
+            # Zero each excluded block's span of this row in one slice assignment,
+            # rather than testing every voxel individually.
+            for bx in range(block_mask.shape[2]):
+                if not block_mask[bz, by, bx]:
+                    x1 = max(0, bx*block_width - ox)
+                    x2 = min(data.shape[2], (bx+1)*block_width - ox)
+                    data[z, y, x1:x2] = 0
+
+
 def nonconsecutive_bincount(label_vol):
     """
     Like np.bincount(), but works well for label volumes with non-consecutive label values.
@@ -119,6 +119,15 @@ class CreateSegmentation(DVIDWorkflow):
             "type": "integer",
             "default": 0
         },
+        "num-partitions": {
+            "description": "If nonzero, group the subvolumes into this many partitions,\n"
+                           "each holding a spatially compact (Z-order) group of subvolumes.\n"
+                           "(Each task then processes several subvolumes.)\n"
+                           "By default (0), each subvolume gets its own partition.",
+            "type": "integer",
+            "minimum": 0,
+            "default": 0
+        },
         "checkpoint-dir": {
             "description": "Specify checkpoint directory",
             "type": "string",
@@ -218,7 +227,8 @@ class CreateSegmentation(DVIDWorkflow):
                 self.chunksize, self.overlap // 2,
                 True,
                 self.config_data["dvid-info"]["partition-method"],
-                self.config_data["dvid-info"]["partition-filter"] )
+                self.config_data["dvid-info"]["partition-filter"],
+                self.config_data["options"]["num-partitions"] or None )
 
         # do not recompute ROI for each iteration
         distsubvolumes.persist()
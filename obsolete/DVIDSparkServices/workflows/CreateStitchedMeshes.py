@@ -2,7 +2,6 @@ import os
 import csv
 import copy
 import tarfile
-import socket
 import logging
 from math import ceil
 from functools import partial
@@ -23,7 +22,7 @@ from dvid_resource_manager.client import ResourceManagerClient
 
 import DVIDSparkServices.rddtools as rt
 from DVIDSparkServices.auto_retry import auto_retry
-from DVIDSparkServices.util import Timer, persist_and_execute, num_worker_nodes, cpus_per_worker, default_dvid_session
+from DVIDSparkServices.util import Timer, persist_and_execute, num_worker_nodes, cpus_per_worker, default_dvid_session, local_hostname
 from DVIDSparkServices.workflow.workflow import Workflow
 from DVIDSparkServices.sparkdvid.sparkdvid import sparkdvid 
 from DVIDSparkServices.reconutils.morpho import object_masks_for_labels
@@ -615,7 +614,7 @@ class CreateStitchedMeshes(Workflow):
         # --> (segment_id, mesh_for_one_block)
         decimation_fraction = config["mesh-config"]["pre-stitch-decimation"]
         if decimation_fraction < 1.0:
-            @self.collect_log(lambda _: socket.gethostname() + '-mesh-decimation')
+            @self.collect_log(lambda _: local_hostname() + '-mesh-decimation')
             def decimate(id_mesh_bcount):
                 import DVIDSparkServices # Ensure faulthandler logging is active. # @UnusedImport
                 segment_id, (mesh, body_vertex_count) = id_mesh_bcount
@@ -6,6 +6,7 @@ from DVIDSparkServices.sparkdvid.sparkdvid import retrieve_node_service
 from DVIDSparkServices.json_util import NumpyConvertingEncoder
 from libdvid import ConnectionMethod
 import numpy
+from numba import jit
 from DVIDSparkServices.sparkdvid.Subvolume import SubvolumeNamedTuple
 
 class EvaluateSeg(DVIDWorkflow):
@@ -295,25 +296,18 @@ class EvaluateSeg(DVIDWorkflow):
         else:
             # should only filter bodies for non-sparse mode
             # if the bodies densely cover the volume
+            important_bodies_arr = numpy.asarray(important_bodies, dtype=numpy.uint64)
+
             def filter_bodies(label_pairs):
-                from DVIDSparkServices.sparkdvid.CompressedNumpyArray import CompressedNumpyArray
-                import numpy
+                # (map_labels64_pair() yields plain arrays, which is also
+                # what _split_disjoint_labels() expects, so no (de)compression here.)
+                subvolume, labelgt, label2 = label_pairs
 
-                subvolume, labelgtc, label2c = label_pairs
+                # filter bodies from gt (one pass, with a boolean mask)
+                keep = numpy.isin(labelgt, important_bodies_arr)
+                labelgt[~keep] = 0
 
-                # extract numpy arrays
-                labelgt = labelgtc.deserialize()
-                
-                # filter bodies from gt
-                bodylist = numpy.unique(labelgt)
-                intersecting_bodies = set(bodylist).intersection(set(important_bodies))
-                mask = numpy.zeros(labelgt.shape)
-                for body in intersecting_bodies:
-                    mask[labelgt==body] = 1
-                labelgt[mask==0] = 0
-
-                # compress results
-                return (subvolume, CompressedNumpyArray(labelgt), label2c)
+                return (subvolume, labelgt, label2)
            
             if len(important_bodies) > 0:
                 lpairs = lpairs.mapValues(filter_bodies)
@@ -347,39 +341,39 @@ class EvaluateSeg(DVIDWorkflow):
         # => (key, (subvolume, seggt-split, seg2-split, seggt-map, seg2-map))
         lpairs_split = lpairs.mapValues(_split_disjoint_labels)
 
+        # Keep a handle to the cached pre-CC RDD, so it can be released
+        # once the stats (its last consumer) have been computed.
+        # (PySpark always stores serialized; allow spilling to disk
+        # rather than recomputing the split from scratch.)
+        cc_input = None
         if self.config_data["options"]["run-cc"]: 
             # save current segmentation state
-            lpairs_split.persist()
+            cc_input = lpairs_split.persist(StorageLevel.MEMORY_AND_DISK)
 
             # apply connected components
+            def _face_map(face, labelmap):
+                """Restrict a subvolume's split-label map to the labels on one face.
+                
+                Each face is shuffled separately, so sending only the relevant
+                entries avoids pickling the full map six times per subvolume.
+                """
+                return { label: labelmap[label] for label in numpy.unique(face) if label in labelmap }
+
             def _extractfaces(label_pairs):
                 """Extracts 6 sides from each cube.
                 """
                 
                 key, (subvolume, gtmap, segmap, gtvol, segvol) = label_pairs
 
-                # extract unique bodies not remapped
-                allgt = set(numpy.unique(gtvol))
-                allseg = set(numpy.unique(segvol))
-
-                gtmapbodies = set()
-                for key2, body in gtmap.items():
-                    gtmapbodies.add(key2)
-                segmapbodies = set()
-                for key2, body in segmap.items():
-                    segmapbodies.add(key2)
-                allgt = allgt.difference(gtmapbodies)
-                if 0 in allgt:
-                    allgt.remove(0)
-                allseg = allseg.difference(segmapbodies)
-                if 0 in allseg:
-                    allseg.remove(0)
-                """
-                if 0 in allseg:
-                    allseg.remove(0)
-                if 0 in allgt:
-                    allgt.remove(0)
-                """
+                # extract unique bodies not remapped (as arrays, not sets)
+                def _unmapped_bodies(vol, labelmap):
+                    bodies = numpy.unique(vol)
+                    mapped = numpy.fromiter(labelmap.keys(), dtype=bodies.dtype, count=len(labelmap))
+                    bodies = numpy.setdiff1d(bodies, mapped, assume_unique=True)
+                    return bodies[bodies != 0]
+
+                allgt = _unmapped_bodies(gtvol, gtmap)
+                allseg = _unmapped_bodies(segvol, segmap)
 
                 zmax,ymax,xmax = gtvol.shape
                 start = (subvolume.box.z1, subvolume.box.y1, subvolume.box.x1)
@@ -400,19 +394,19 @@ class EvaluateSeg(DVIDWorkflow):
                                      [(slicex0, gtmap, key, True, allgt)] ))
                 mappedfaces.append(( ((start[0], start[1], start[2]+xmax),
                                       (start[0]+zmax, start[1]+ymax, start[2]+xmax+1), True), 
-                                     [(slicexmax, gtmap, key, False, set())] ))
+                                     [(slicexmax, _face_map(slicexmax, gtmap), key, False, set())] ))
                 
                 mappedfaces.append(( (start, (start[0]+zmax, start[1]+1, start[2]+xmax), True), 
-                                     [(slicey0, gtmap, key, False, set())] ))
+                                     [(slicey0, _face_map(slicey0, gtmap), key, False, set())] ))
                 mappedfaces.append(( ((start[0], start[1]+ymax, start[2]),
                                       (start[0]+zmax, start[1]+ymax+1, start[2]+xmax), True), 
-                                     [(sliceymax, gtmap, key, False, set())] ))
+                                     [(sliceymax, _face_map(sliceymax, gtmap), key, False, set())] ))
                 
                 mappedfaces.append(( (start, (start[0]+1, start[1]+ymax, start[2]+xmax), True), 
-                                     [(slicez0, gtmap, key, False, set())] ))
+                                     [(slicez0, _face_map(slicez0, gtmap), key, False, set())] ))
                 mappedfaces.append(( ((start[0]+zmax, start[1], start[2]),
                                       (start[0]+zmax+1, start[1]+ymax, start[2]+xmax), True), 
-                                     [(slicezmax, gtmap, key, False, set())] ))
+                                     [(slicezmax, _face_map(slicezmax, gtmap), key, False, set())] ))
 
                 # grab 6 faces for seg
                 segslicex0 = segvol[:,:,0]
@@ -428,19 +422,19 @@ class EvaluateSeg(DVIDWorkflow):
                                      [(segslicex0, segmap, key, True, allseg)] ))
                 mappedfaces.append(( ((start[0], start[1], start[2]+xmax),
                                       (start[0]+zmax, start[1]+ymax, start[2]+xmax+1), False), 
-                                     [(segslicexmax, segmap, key, False, set())] ))
+                                     [(segslicexmax, _face_map(segslicexmax, segmap), key, False, set())] ))
                 
                 mappedfaces.append(( (start, (start[0]+zmax, start[1]+1, start[2]+xmax), False), 
-                                     [(segslicey0, segmap, key, False, set())] ))
+                                     [(segslicey0, _face_map(segslicey0, segmap), key, False, set())] ))
                 mappedfaces.append(( ((start[0], start[1]+ymax, start[2]),
                                       (start[0]+zmax, start[1]+ymax+1, start[2]+xmax), False), 
-                                     [(segsliceymax, segmap, key, False, set())] ))
+                                     [(segsliceymax, _face_map(segsliceymax, segmap), key, False, set())] ))
                 
                 mappedfaces.append(( (start, (start[0]+1, start[1]+ymax, start[2]+xmax), False), 
-                                     [(segslicez0, segmap, key, False, set())] ))
+                                     [(segslicez0, _face_map(segslicez0, segmap), key, False, set())] ))
                 mappedfaces.append(( ((start[0]+zmax, start[1], start[2]),
                                       (start[0]+zmax+1, start[1]+ymax, start[2]+xmax), False), 
-                                     [(segslicezmax, segmap, key, False, set())] ))
+                                     [(segslicezmax, _face_map(segslicezmax, segmap), key, False, set())] ))
         
                 return mappedfaces
 
@@ -472,11 +466,20 @@ class EvaluateSeg(DVIDWorkflow):
                 seg1, segmap, sid, hack1, segbodies = faces[0]
                 seg2, segmap2, sid2, hack2, segbodies2 = faces[1]
 
-                seg1 = seg1.flatten()
-                seg2 = seg2.flatten()
+                # (ravel() copies only if the face isn't already C-contiguous)
+                seg1 = seg1.ravel()
+                seg2 = seg2.ravel()
                
-                seg1seg2 = numpy.column_stack((seg1, seg2))
-                unique_pairs = numpy.unique(seg1seg2, axis=0)
+                # Find the unique (seg1, seg2) pairs with a 1-D unique():
+                # compact each side to its unique-value indexes, then
+                # pack each pair of indexes into a single uint64 key.
+                # (Same pairs, same order as unique(..., axis=0), but much faster.)
+                u1, inv1 = numpy.unique(seg1, return_inverse=True)
+                u2, inv2 = numpy.unique(seg2, return_inverse=True)
+                num_u2 = numpy.uint64(len(u2))
+                packed = inv1.astype(numpy.uint64) * num_u2 + inv2.astype(numpy.uint64)
+                i1, i2 = numpy.divmod(numpy.unique(packed), num_u2)
+                unique_pairs = numpy.column_stack((u1[i1], u2[i2]))
 
                 bodymatches = []
 
@@ -518,8 +521,13 @@ class EvaluateSeg(DVIDWorkflow):
                 bodies1.extend(bodies2)
                 return bodies1
 
-            flatmatches = lpairs_split.flatMap(_extractfaces).reduceByKey(_reducematches).flatMap(_extractmatches)
-            matches = flatmatches.reduceByKey(_reduce_bodies)
+            # Keep the face and body shuffles at the same parallelism as the subvolumes
+            # (one partition per subvolume), rather than Spark's default partition count.
+            num_partitions = lpairs_split.getNumPartitions()
+            flatmatches = ( lpairs_split.flatMap(_extractfaces)
+                                        .reduceByKey(_reducematches, num_partitions)
+                                        .flatMap(_extractmatches) )
+            matches = flatmatches.reduceByKey(_reduce_bodies, num_partitions)
             
             
             # should be small enough that the list can be global
@@ -527,62 +535,32 @@ class EvaluateSeg(DVIDWorkflow):
                 """Extract bodies that should be split into more than one piece.
                 """
                 (bodyid, isgt), matchlist = matches
-                
-                merges = {} 
-                mergeset = {} 
 
+                # Index the (label, sid) nodes and collect the merges between them
+                node_ids = {}
+                edges = []
                 for match in matchlist:
                     # handle original mapping disjoint ids
                     if len(match) == 3:
-                        val = (match[0], match[1])
-                        if val not in merges:
-                           merges[val] = val
-                           mergeset[val] = set([val])
+                        node_ids.setdefault((match[0], match[1]), len(node_ids))
                         continue
 
-                    val, val2 = match
-                    if val2 < val:
-                        val, val2 = val2, val
-                    
-                    mappedval = val
-                    if mappedval in merges:
-                        mappedval = merges[mappedval]
-                    else:
-                        merges[val] = val 
-                    
-                    if mappedval not in mergeset:
-                        mergeset[mappedval] = set([val])
-                    else:
-                        mergeset[mappedval].add(val)
-
-                    mappedval2 = val2
-                    if mappedval2 in merges:
-                        mappedval2 = merges[mappedval2]
-                    
-                    if mappedval2 not in mergeset:
-                        mergeset[mappedval2] = set([val2])
-                    else:
-                        mergeset[mappedval2].add(val2)
-
-                    # if the mapped value is equal, no need for further processing
-                    if mappedval2 == mappedval:
-                        continue
-
-                    merges[mappedval2] = mappedval
+                    node1, node2 = match
+                    id1 = node_ids.setdefault(node1, len(node_ids))
+                    id2 = node_ids.setdefault(node2, len(node_ids))
+                    edges.append((id1, id2))
 
-                    for iterval in mergeset[mappedval2]:
-                        merges[iterval] = mappedval
+                edges = numpy.array(edges, dtype=numpy.int64).reshape(-1, 2)
+                roots = _union_find_roots(edges, len(node_ids))
 
-                    mergeset[mappedval] = mergeset[mappedval].union(mergeset[mappedval2])
-                    del mergeset[mappedval2]
+                groups = {}
+                for node, root in zip(node_ids.keys(), roots):
+                    groups.setdefault(root, set()).add(node)
 
-                if len(mergeset) == 1:
+                if len(groups) == 1:
                     return []
 
-                bodygroups = []
-                for (dummy, group) in mergeset.items():
-                    bodygroups.append(((bodyid, isgt), group))
-                return bodygroups
+                return [((bodyid, isgt), group) for group in groups.values()]
             
             
             # choose very large arbitary index for simplicity (but below js 2^53 limit)
@@ -607,10 +585,10 @@ class EvaluateSeg(DVIDWorkflow):
                 sid1.extend(sid2)
                 return sid1
 
-            sidccbodies = mapped_bodies.flatMap(cc2sid).reduceByKey(groupsids, lpairs_split.getNumPartitions())
+            sidccbodies = mapped_bodies.flatMap(cc2sid).reduceByKey(groupsids, num_partitions)
 
             # shuffle mappings to substacks (does this cause a shuffle)
-            lpairs_split_j = lpairs_split.leftOuterJoin(sidccbodies, lpairs_split.getNumPartitions())
+            lpairs_split_j = lpairs_split.leftOuterJoin(sidccbodies, num_partitions)
 
 
             # give new ids for subvolumes
@@ -693,6 +671,9 @@ class EvaluateSeg(DVIDWorkflow):
         # loading into data structures on the driver.
         stats = evaluator.calculate_stats(lpairs_proc)
 
+        if cc_input is not None:
+            cc_input.unpersist()
+
 
         if self.config_data["options"]["run-cc"]: 
             # make a global remap function
@@ -700,6 +681,7 @@ class EvaluateSeg(DVIDWorkflow):
                 (((bodyid, isgt), group), rid) = mapped_body
                 return (bodyid, rid+ccstartbodyindex)
             bodies_remap = mapped_bodies.map(extract_disjoint_bodies).collect()
+            mapped_bodies.unpersist()
             
             # global map of cc bodies to original body (unique across GT and seg)
             cc2body = {}
@@ -773,3 +755,43 @@ class EvaluateSeg(DVIDWorkflow):
         node_service.create_keyvalue(self.writelocation)
         node_service.put(self.writelocation, fileloc, json.dumps(stats, cls=NumpyConvertingEncoder).encode('utf-8'))
 
+
+@jit(nopython=True, nogil=True)
+def _find_root(parent, node):
+    # iterative, with path halving
+    while parent[node] != node:
+        parent[node] = parent[parent[node]]
+        node = parent[node]
+    return node
+
+
+@jit(nopython=True, nogil=True)
+def _union_find_roots(edges, num_nodes):
+    """
+    Union-find (with union by rank) over nodes 0..num_nodes-1.
+
+    Args:
+        edges: int64 array of shape (E, 2), listing node pairs to merge.
+        num_nodes: Total number of nodes.
+
+    Returns:
+        int64 array of length num_nodes, giving the root of each node's component.
+    """
+    parent = numpy.arange(num_nodes)
+    rank = numpy.zeros(num_nodes, numpy.int32)
+
+    for i in range(len(edges)):
+        root1 = _find_root(parent, edges[i, 0])
+        root2 = _find_root(parent, edges[i, 1])
+        if root1 == root2:
+            continue
+        if rank[root1] < rank[root2]:
+            root1, root2 = root2, root1
+        parent[root2] = root1
+        if rank[root1] == rank[root2]:
+            rank[root1] += 1
+
+    roots = numpy.empty(num_nodes, numpy.int64)
+    for node in range(num_nodes):
+        roots[node] = _find_root(parent, node)
+    return roots
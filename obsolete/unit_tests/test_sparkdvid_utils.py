@@ -6,10 +6,30 @@ from libdvid import DVIDNodeService, DVIDServerService
 
 from neuclease.util import box_to_slicing
 from DVIDSparkServices.reconutils.downsample import downsample_binary_3d_suppress_zero
-from DVIDSparkServices.sparkdvid.sparkdvid import sparkdvid
+from DVIDSparkServices.sparkdvid.sparkdvid import sparkdvid, zorder_codes
 
 TEST_DVID_SERVER = "http://127.0.0.1:8000"
 
+class Test_zorder_codes(unittest.TestCase):
+
+    def test_axis_bits(self):
+        codes = zorder_codes([(0,0,0), (0,0,1), (0,1,0), (1,0,0), (1,1,1), (0,0,2)])
+        assert codes.tolist() == [0, 1, 2, 4, 7, 8]
+
+    def test_contiguous_runs_are_compact(self):
+        """
+        parallelize_roi() hands Z-order-sorted subvolumes to sc.parallelize(),
+        which slices them into contiguous runs.  For a 4x4x4 grid split 8 ways,
+        each run should be exactly one aligned 2x2x2 cube.
+        """
+        cells = np.array(list(np.ndindex(4,4,4)))
+        np.random.shuffle(cells)
+        order = np.argsort(zorder_codes(cells), kind='stable')
+        for run in np.array_split(cells[order], 8):
+            assert len(run) == 8
+            assert ((run // 2) == (run[0] // 2)).all()
+
+
 class Test_get_union_block_mask_for_bodies(unittest.TestCase):
     
     @classmethod
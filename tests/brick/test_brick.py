@@ -7,12 +7,12 @@ import pytest
 import numpy as np
 import pandas as pd
 
-from neuclease.util import extract_subvol, box_intersection, Grid
+from neuclease.util import extract_subvol, box_intersection, Grid, boxes_from_grid
 
 from flyemflows.util import DebugClient, COMPRESSION_METHODS
-from flyemflows.brick import ( Brick, BrickWall, generate_bricks_from_volume_source,
+from flyemflows.brick import ( Brick, BrickWall, generate_bricks_from_volume_source, boxes_array_from_grid, clip_boxes,
                                realign_bricks_to_new_grid, split_brick, assemble_brick_fragments,
-                               pad_brick_data_from_volume_source, extract_halos )
+                               pad_brick_data_from_volume_source, extract_halos, apply_label_mapping )
 from neuclease.util.box import overwrite_subvol
 
 def box_as_tuple(box):
@@ -55,6 +55,24 @@ def test_generate_bricks():
         assert sys.getsizeof(brick) > sys.getsizeof(brick.volume)
 
 
+def test_boxes_array_from_grid():
+    bounding_box = np.array([(15,30), (95,290)])
+    for grid in (Grid( (10,20), (12,3) ), Grid( (10,20), (12,3), 1 )):
+        for include_halos in (False, True):
+            expected = np.array(list(boxes_from_grid(bounding_box, grid, include_halos=include_halos)))
+            boxes = boxes_array_from_grid(bounding_box, grid, include_halos=include_halos)
+            assert boxes.shape == expected.shape == (9 * 14, 2, 2)
+            assert (boxes == expected).all()
+
+
+def test_clip_boxes():
+    bounding_box = np.array([(15,30), (95,290)])
+    boxes = boxes_array_from_grid(bounding_box, Grid( (10,20), (12,3), 1 ), include_halos=True)
+    clipped = clip_boxes(boxes, bounding_box)
+    expected = np.array([box_intersection(box, bounding_box) for box in boxes])
+    assert (clipped == expected).all()
+
+
 def test_split_brick():
     grid = Grid( (10,20), (12,3) )
     volume = np.random.randint(0,10, (100,300) )
@@ -94,6 +112,41 @@ def test_split_brick():
         assert (frag.volume == extract_subvol(volume, frag.physical_box)).all()
 
 
+def test_split_brick_SINGLE_DESTINATION():
+    """
+    If a brick lies entirely within one destination block,
+    the data is passed through unchanged (no uncompress/recompress).
+    """
+    volume = np.random.randint(0,10, (100,300) )
+    logical_box = np.array([(10,20), (20,40)])
+    physical_box = np.array([(12,23), (20,40)])
+    original_brick = Brick( logical_box, physical_box, extract_subvol(volume, physical_box), location_id=(1,1), compression='lz4_2x' )
+
+    new_grid = Grid((20,40), (0,0))
+    fragments = split_brick(new_grid, original_brick)
+    assert len(fragments) == 1
+
+    frag = fragments[0]
+    assert (frag.logical_box == [(0,0), (20,40)]).all()
+    assert (frag.physical_box == physical_box).all()
+    assert frag.location_id == (0,0)
+
+    # The volume is shared, and the original brick was not compressed as a side-effect.
+    assert frag._volume is original_brick._volume
+    assert original_brick._compressed_volume is None
+    assert (frag.volume == extract_subvol(volume, physical_box)).all()
+
+    # Same for an already-compressed brick: the compressed data is shared.
+    original_brick.compress()
+    frag = split_brick(new_grid, original_brick)[0]
+    assert frag._compressed_volume is original_brick._compressed_volume
+    assert (frag.volume == extract_subvol(volume, physical_box)).all()
+
+    # Same grid: The original brick is returned as-is.
+    same_grid = Grid((10,20), (0,0))
+    assert split_brick(same_grid, original_brick)[0] is original_brick
+
+
 def test_assemble_brick_fragments():
     volume = np.random.randint(0,10, (100,300) )
     
@@ -194,6 +247,29 @@ def test_pad_brick_data_from_volume_source():
     assert (padded_brick.volume == extract_subvol(source_volume, padded_brick.physical_box)).all()
 
 
+def test_pad_brick_data_from_volume_source_SMALL_HALO():
+    """
+    When only a small halo is needed, the halo is fetched separately
+    (rather than fetching the entire padded box).
+    """
+    source_volume = np.random.randint(0,10, (100,300) )
+    logical_box = [(1,0), (11,20)]
+    physical_box = [(3,5), (11, 15)]
+    brick = Brick( logical_box, physical_box, extract_subvol(source_volume, physical_box) )
+
+    fetched_boxes = []
+    def fetch(box):
+        fetched_boxes.append(box_as_tuple(box))
+        return extract_subvol(source_volume, box)
+
+    padding_grid = Grid( (5,5), offset=(1,0) )
+    padded_brick = pad_brick_data_from_volume_source( padding_grid, fetch, brick )
+
+    assert fetched_boxes == [((1,5), (3,15))]
+    assert (padded_brick.physical_box == [(1,5), (11, 15)]).all()
+    assert (padded_brick.volume == extract_subvol(source_volume, padded_brick.physical_box)).all()
+
+
 def test_pad_brick_data_from_volume_source_NO_PADDING_NEEDED():
     source_volume = np.random.randint(0,10, (100,300) )
     logical_box = [(1,0), (11,20)]
@@ -305,6 +381,29 @@ def test_realign_bricks_to_new_grid_WITH_HALO():
         assert (brick.volume == extract_subvol( volume, brick.physical_box )).all()
 
 
+def test_apply_label_mapping():
+    grid = Grid( (10,20), (12,3) )
+    bounding_box = np.array([(15,30), (95,290)])
+    volume = np.random.randint(0,10, (100,300) ).astype(np.uint64)
+    bricks, _num_bricks = generate_bricks_from_volume_source( bounding_box, grid, partial(extract_subvol, volume), DebugClient() )
+
+    # Dense mapping (lookup table), and a sparse one (LabelMapper).
+    # Neither mapping includes label 9, which must be left unchanged.
+    dense_mapping = np.array([(i, 10*i) for i in range(9)], dtype=np.uint64)
+    sparse_mapping = np.array([(1, 10), (2**40, 1)], dtype=np.uint64)
+
+    for mapping in (dense_mapping, sparse_mapping):
+        expected = volume.copy()
+        for orig, new in mapping:
+            expected[volume == orig] = new
+
+        remapped_bricks = apply_label_mapping(bricks, mapping).compute()
+        assert len(remapped_bricks) == 9 * 14
+        for brick in remapped_bricks:
+            assert brick.volume.dtype == volume.dtype
+            assert (brick.volume == extract_subvol(expected, brick.physical_box)).all()
+
+
 def test_compression():
     vol_box = [(0,0,0), (100,100,120)]
     volume = np.random.randint(10, size=vol_box[1], dtype=np.uint64)
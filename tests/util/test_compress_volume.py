@@ -0,0 +1,23 @@
+import pytest
+import numpy as np
+
+from flyemflows.util import compress_volume, uncompress_volume, COMPRESSION_METHODS
+
+
+@pytest.mark.parametrize('method', COMPRESSION_METHODS)
+def test_compress_roundtrip(method):
+    box = np.array([(64, 128, 192), (128, 256, 320)])
+    volume = np.zeros(box[1] - box[0], np.uint64)
+    volume[:, :64] = 1
+    volume[10:20, 10:20, 10:20] = 2
+
+    encoded_box, encoded = compress_volume(method, volume, box)
+    assert (encoded_box[0] <= box[0]).all() and (encoded_box[1] >= box[1]).all()
+
+    decoded = uncompress_volume(method, encoded, np.uint64, np.asarray(encoded_box), box)
+    assert decoded.shape == volume.shape
+    assert (decoded == volume).all()
+
+
+if __name__ == "__main__":
+    pytest.main(['-s', '--tb=native', '--pyargs', 'tests.util.test_compress_volume'])
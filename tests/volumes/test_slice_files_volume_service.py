@@ -10,8 +10,12 @@ from neuclease.util import box_to_slicing
 from flyemflows.volumes import SliceFilesVolumeService
 
 
-@pytest.fixture()
-def read_slices_setup():
+@pytest.fixture(scope='module')
+def slices_on_disk():
+    """
+    Write the slices only once for all of the read tests in this module.
+    (Encoding hundreds of PNG files is the most expensive part of these tests.)
+    """
     volume = np.random.randint(100, size=(512, 256, 128), dtype=np.uint8)
     volume = vigra.taggedView(volume, 'zyx')
     
@@ -20,6 +24,14 @@ def read_slices_setup():
     for z, z_slice in enumerate(volume):
         vigra.impex.writeImage(z_slice, slice_fmt.format(z))
 
+    return volume, slice_fmt
+
+
+@pytest.fixture()
+def read_slices_setup(slices_on_disk):
+    volume, slice_fmt = slices_on_disk
+
+    # Each test gets a fresh config, since the service overwrites some of its entries.
     config = {
         "slice-files": {
             "slice-path-format": slice_fmt